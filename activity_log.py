@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+LOW = 0
+NORMAL = 1
+
+
+# Background pipeline for the activity channel.
+#
+# Handlers call log() which only appends to an in-memory queue and returns.
+# A background task wakes up every `interval` seconds and posts everything
+# queued so far as one digest, split into as few messages as the length limit
+# allows. The queue is bounded: when it is full, low-priority events (button
+# clicks and the like) are shed first so user-facing work is never held up.
+class ActivityLog:
+    def __init__(self, chat_id, interval=10.0, max_queue=2000):
+        self.chat_id = chat_id
+        self.interval = interval
+        self.max_queue = max_queue
+        self.dropped = 0
+        self.posted = 0
+        self._low = deque()
+        self._normal = deque()
+        self._send_message = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._low) + len(self._normal)
+
+    def log(self, message, priority=NORMAL):
+        if len(self) >= self.max_queue:
+            if priority == LOW:
+                self.dropped += 1
+                return
+            # Make room by shedding the oldest low-priority event if there is one
+            (self._low or self._normal).popleft()
+            self.dropped += 1
+
+        entry = (time.time(), message)
+        if priority == LOW:
+            self._low.append(entry)
+        else:
+            self._normal.append(entry)
+
+    def start(self, send_message):
+        # send_message is a coroutine function taking chat_id and text, e.g. bot.send_message
+        self._send_message = send_message
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Post whatever is still queued before shutting down
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def _drain(self):
+        entries = sorted(list(self._low) + list(self._normal))
+        self._low.clear()
+        self._normal.clear()
+        return entries
+
+    async def flush(self):
+        entries = self._drain()
+        dropped, self.dropped = self.dropped, 0
+        if not entries and not dropped:
+            return
+
+        lines = [f"{time.strftime('%H:%M:%S', time.gmtime(ts))} {message}" for ts, message in entries]
+        if dropped:
+            lines.append(f"({dropped} events dropped while the queue was full)")
+
+        for text in digest_messages(lines):
+            try:
+                await self._send_message(chat_id=self.chat_id, text=text)
+                self.posted += 1
+            except Exception as e:
+                logger.error(f"Failed to post activity digest: {e}")
+        logger.info(f"Posted {len(entries)} activity events.")
+
+
+def digest_messages(lines, limit=MAX_MESSAGE_LENGTH):
+    """Pack lines into as few messages of at most `limit` characters as possible."""
+    messages = []
+    current = []
+    length = 0
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 1] + '…'
+        extra = len(line) + (1 if current else 0)
+        if current and length + extra > limit:
+            messages.append('\n'.join(current))
+            current, length = [], 0
+            extra = len(line)
+        current.append(line)
+        length += extra
+    if current:
+        messages.append('\n'.join(current))
+    return messages
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from ratelimit import TokenBucket
+
+# Why an update was turned away
+SHED_USER = 'user'
+SHED_GLOBAL = 'global'
+
+
+# Admission control for incoming updates.
+#
+# Runs before any handler does I/O. Every user has a small token bucket and
+# an update from a user whose bucket is empty is shed outright: a client
+# sending dozens of taps a second gets the first few answered and nothing
+# else costs us a query or an API call. Admitted updates then take a token
+# from a global bucket; when the whole bot is over its rate an update waits
+# its turn for one, or is shed as well if that would take over max_delay.
+#
+# Buckets are plain slotted objects in a dict. Once max_users is reached,
+# users whose bucket has refilled are forgotten; they start out full anyway.
+class AdmissionControl:
+    def __init__(self, user_rate=1.0, user_burst=5, global_rate=100.0, global_burst=200, max_delay=1.0,
+                 max_users=100000):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_delay = max_delay
+        self.max_users = max_users
+        self._global = TokenBucket(global_rate, global_burst)
+        self._users = {}
+        self.admitted = 0
+        self.delayed = 0
+        self.shed = {SHED_USER: 0, SHED_GLOBAL: 0}
+        self._reported = 0
+
+    def _user_bucket(self, user_id, now):
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            if len(self._users) >= self.max_users:
+                for key in [key for key, b in self._users.items() if b.full(now)]:
+                    del self._users[key]
+            bucket = self._users[user_id] = TokenBucket(self.user_rate, self.user_burst, now)
+        return bucket
+
+    async def admit(self, user_id):
+        """Return None if the update may proceed, otherwise why it was shed."""
+        now = time.monotonic()
+        if not self._user_bucket(user_id, now).take(now):
+            self.shed[SHED_USER] += 1
+            return SHED_USER
+
+        if self._global.delay(now) > self.max_delay:
+            self.shed[SHED_GLOBAL] += 1
+            return SHED_GLOBAL
+        # Reserve the token now so concurrent waiters queue up behind each other
+        delay = self._global.reserve(now)
+        if delay:
+            self.delayed += 1
+            await asyncio.sleep(delay)
+        self.admitted += 1
+        return None
+
+    def shed_since_report(self):
+        """Updates shed since the previous call, for periodic reporting."""
+        total = sum(self.shed.values())
+        shed, self._reported = total - self._reported, total
+        return shed
+
+    def stats(self):
+        return {'admitted': self.admitted, 'delayed': self.delayed, 'shed': dict(self.shed),
+                'users': len(self._users)}
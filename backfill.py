@@ -0,0 +1,201 @@
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import time
+
+from migrations import DB_PATH, migrate
+
+# Streaming bulk loader for the videos table.
+#
+# Input is either a channel export (result.json, {"messages": [...]}) or JSON
+# lines, one media per line: a bare file_id, a JSON string, or an object with
+# file_id and optionally file_unique_id / file_type. Nothing is read into
+# memory as a whole; the export is decoded one message at a time with
+# raw_decode over a sliding buffer. Rows go in with executemany, one
+# transaction per chunk, and media already in the table (same file_id or
+# file_unique_id) is skipped.
+#
+# Telegram Desktop exports reference downloaded files by path and carry no Bot
+# API file_id; such messages are counted as skipped. Exports made from Bot API
+# updates (where media objects have file_id) load fine.
+#
+# The bot only picks from its in-memory catalog. A running bot adds rows
+# loaded here on its next catalog refresh (every CATALOG_REFRESH_INTERVAL
+# seconds, 60 by default), or at the latest when it restarts.
+CHUNK_SIZE = 10000
+READ_SIZE = 1 << 20
+
+# Bot API message fields holding media, in the order the bot checks them
+MEDIA_FIELDS = [
+    ('video', "Video"),
+    ('photo', "Photo"),
+    ('document', "Document"),
+    ('audio', "Audio"),
+    ('voice', "Voice Message"),
+    ('sticker', "Sticker"),
+]
+
+INSERT_SQL = '''
+    INSERT INTO videos (file_id, file_unique_id, file_type)
+    SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM videos WHERE file_id = ?)
+    ON CONFLICT (file_unique_id) DO NOTHING
+'''
+
+_MESSAGES_KEY = re.compile(r'"messages"\s*:\s*\[')
+_WHITESPACE = re.compile(r'[\s,]*')
+
+
+def iter_export_messages(stream, read_size=READ_SIZE):
+    """Yield the objects of an export's "messages" array one at a time."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        match = _MESSAGES_KEY.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        chunk = stream.read(read_size)
+        if not chunk:
+            raise ValueError("No \"messages\" array found in export")
+        # Keep a tail in case the key straddles two reads
+        buffer = buffer[-16:] + chunk
+
+    pos = 0
+    eof = False
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+        if pos > read_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def media_from_export(message):
+    """Return (file_id, file_unique_id, file_type) from a Bot API-style message dict, or None."""
+    for field, file_type in MEDIA_FIELDS:
+        media = message.get(field)
+        if isinstance(media, list) and media:
+            # Photos come as a list of sizes; take the largest
+            media = media[-1]
+        if isinstance(media, dict) and media.get('file_id'):
+            return media['file_id'], media.get('file_unique_id'), file_type
+    return None
+
+
+def media_from_line(line, default_type):
+    line = line.strip()
+    if not line:
+        return None
+    if line[0] not in '{"':
+        return line, None, default_type
+    value = json.loads(line)
+    if isinstance(value, str):
+        return value, None, default_type
+    return value['file_id'], value.get('file_unique_id'), value.get('file_type', default_type)
+
+
+def iter_rows(stream, fmt, default_type, stats):
+    if fmt == 'export':
+        for message in iter_export_messages(stream):
+            stats['read'] += 1
+            media = media_from_export(message)
+            if media is None:
+                stats['skipped'] += 1
+                continue
+            yield media
+    else:
+        for line in stream:
+            media = media_from_line(line, default_type)
+            if media is None:
+                continue
+            stats['read'] += 1
+            yield media
+
+
+def load(conn, rows, chunk_size=CHUNK_SIZE, progress=None):
+    """Insert rows in chunked transactions; returns how many were new."""
+    inserted = 0
+    chunk = []
+    for file_id, file_unique_id, file_type in rows:
+        chunk.append((file_id, file_unique_id, file_type, file_id))
+        if len(chunk) >= chunk_size:
+            inserted += _insert_chunk(conn, chunk)
+            chunk = []
+            if progress:
+                progress(inserted)
+    if chunk:
+        inserted += _insert_chunk(conn, chunk)
+    return inserted
+
+
+def _insert_chunk(conn, chunk):
+    before = conn.total_changes
+    with conn:
+        conn.executemany(INSERT_SQL, chunk)
+    return conn.total_changes - before
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bulk-load file_ids into the videos table.",
+        epilog="A running bot offers the new rows after its next catalog refresh "
+               "(CATALOG_REFRESH_INTERVAL, 60s by default) or restart."
+    )
+    parser.add_argument('file', help="result.json export or JSONL of file_ids ('-' for stdin)")
+    parser.add_argument('--format', choices=['auto', 'export', 'jsonl'], default='auto')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--type', default="Video", help="file_type for entries that do not name one")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt == 'auto':
+        fmt = 'export' if args.file.endswith('.json') else 'jsonl'
+
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    migrate(conn)
+
+    stats = {'read': 0, 'skipped': 0}
+    started = time.perf_counter()
+
+    def progress(inserted):
+        if stats['read'] % 100000 >= args.chunk_size:
+            return
+        elapsed = time.perf_counter() - started
+        print(f"{stats['read']} read, {inserted} inserted, {stats['read'] / elapsed:.0f} rows/s", file=sys.stderr)
+
+    stream = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+    try:
+        inserted = load(conn, iter_rows(stream, fmt, args.type, stats), args.chunk_size, progress)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    duplicates = stats['read'] - stats['skipped'] - inserted
+    print(f"Read {stats['read']} entries in {elapsed:.1f}s ({stats['read'] / max(elapsed, 1e-9):.0f} rows/s): "
+          f"{inserted} inserted, {duplicates} duplicates, {stats['skipped']} without a file_id. "
+          f"A running bot picks them up on its next catalog refresh.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import asyncio
+
+
+# A background task that sleeps between rounds until woken or timed out.
+#
+# Shared by the workers that run one long-lived loop (payments, ingest,
+# prefetch, chat settings). The owner writes its loop as
+#
+#     while await self._loop.sleep(interval):
+#         ...one round...
+#
+# and calls wake() to cut a sleep short. A wake that arrives while a round is
+# running is kept, so the next sleep returns at once. stop() also sets a flag
+# the loop checks, because asyncio.wait_for can swallow a cancel that lands
+# just as the event fires, which would otherwise leave stop() waiting forever.
+class BackgroundLoop:
+    def __init__(self):
+        self._wake = None
+        self._task = None
+        self._stopping = False
+
+    @property
+    def running(self):
+        return self._task is not None and not self._stopping
+
+    def start(self, run):
+        """Run the coroutine function `run` as the loop's task."""
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(run())
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def sleep(self, timeout):
+        """Wait until wake() or `timeout` seconds; returns False once stop() was called."""
+        if self._stopping:
+            return False
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+        return not self._stopping
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,88 @@
+import argparse
+import random
+import string
+import time
+
+from vulgarity import MILD, SEVERE, Matcher
+
+
+# Micro-benchmark: the old per-word substring loop from t1.py against the
+# Aho-Corasick Matcher, on a synthetic word list and chat messages.
+def random_word(rng, low=4, high=10):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+
+def make_terms(rng, count):
+    terms = []
+    for i in range(count):
+        term = random_word(rng)
+        if i % 5 == 0:
+            term += ' ' + random_word(rng)
+        terms.append((term, SEVERE if i % 3 == 0 else MILD))
+    return terms
+
+
+def make_messages(rng, terms, count, hit_rate):
+    messages = []
+    for _ in range(count):
+        words = [random_word(rng, 2, 8) for _ in range(rng.randint(5, 30))]
+        if rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words)), rng.choice(terms)[0])
+        messages.append(' '.join(words))
+    return messages
+
+
+def loop_severity(text, bad_words, very_bad_words):
+    # What handle_message used to do at the hard block level
+    text = text.lower()
+    for word in very_bad_words:
+        if word in text:
+            return SEVERE
+    for word in bad_words:
+        if word in text:
+            return MILD
+    return 0
+
+
+def bench(fn, messages, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in messages:
+            fn(message)
+        best = min(best, time.perf_counter() - started)
+    return best / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the word-loop filter with the Aho-Corasick matcher.")
+    parser.add_argument('--terms', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--hit-rate', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'terms':>6} {'build ms':>9} {'loop us/msg':>12} {'matcher us/msg':>15} {'speedup':>8}")
+    for count in args.terms:
+        rng = random.Random(args.seed)
+        terms = make_terms(rng, count)
+        messages = make_messages(rng, terms, args.messages, args.hit_rate)
+        bad_words = [term for term, severity in terms if severity == MILD]
+        very_bad_words = [term for term, severity in terms if severity == SEVERE]
+
+        started = time.perf_counter()
+        matcher = Matcher(terms)
+        build = (time.perf_counter() - started) * 1000
+
+        # The matcher normalizes, so it may catch more, but never less
+        for message in messages[:200]:
+            assert matcher.severity(message) or not loop_severity(message, bad_words, very_bad_words), message
+
+        loop = bench(lambda m: loop_severity(m, bad_words, very_bad_words), messages, args.repeat)
+        matched = bench(matcher.severity, messages, args.repeat)
+        print(f"{count:>6} {build:>9.1f} {loop:>12.1f} {matched:>15.1f} {loop / matched:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
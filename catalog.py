@@ -0,0 +1,144 @@
+import base64
+import binascii
+from array import array
+
+# In-process copy of the videos table: id -> (file_id, file_type).
+#
+# Rows live in flat arrays indexed by video id rather than as Python tuples.
+# File ids are packed back-to-back in one bytearray (base64-decoded when that
+# round-trips exactly, which trims another quarter), so a million-row catalog
+# costs roughly 60-70 bytes per row instead of several hundred.
+#
+# Ids are also partitioned by file_type into append-only arrays, so the picker
+# can walk one type at a time and never lands on media it cannot send. Stored
+# cursors are positions in these arrays, so an id never leaves its partition:
+# discard() only hides it (get() returns None, which the picker skips) and
+# restore() brings it back in place.
+PACKED = 0x80
+
+MISSING = 0
+
+
+class Catalog:
+    def __init__(self):
+        self._blob = bytearray()
+        self._starts = array('I', [0])
+        self._lengths = array('H', [0])
+        self._types = bytearray(1)
+        self._type_names = [None]
+        self._type_codes = {}
+        self._partitions = {}
+        # Type codes of hidden ids, for restore()
+        self._hidden = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, video_id):
+        return 0 < video_id < len(self._types) and self._types[video_id] != MISSING
+
+    @property
+    def max_id(self):
+        return len(self._types) - 1
+
+    def load(self, cursor, after=0):
+        """Add rows with ids above `after`; returns how many were added."""
+        # Quarantined rows keep their partition positions but stay hidden
+        # until revalidation releases them
+        cursor.execute(
+            "SELECT v.id, v.file_id, v.file_type, q.video_id IS NOT NULL FROM videos v "
+            "LEFT JOIN video_quarantine q ON q.video_id = v.id WHERE v.id > ? ORDER BY v.id",
+            (after,)
+        )
+        added = 0
+        for video_id, file_id, file_type, quarantined in cursor:
+            self.add(video_id, file_id, file_type)
+            added += 1
+            if quarantined:
+                self.discard(video_id)
+        return added
+
+    def add(self, video_id, file_id, file_type):
+        code = self._type_codes.get(file_type)
+        if code is None:
+            code = len(self._type_names)
+            if code >= PACKED:
+                raise ValueError(f"Too many file types in catalog: {file_type}")
+            self._type_names.append(file_type)
+            self._type_codes[file_type] = code
+            self._partitions[file_type] = array('I')
+
+        data = _pack(file_id)
+        if data is not None:
+            code |= PACKED
+        else:
+            data = file_id.encode()
+
+        if video_id >= len(self._types):
+            grow = video_id + 1 - len(self._types)
+            self._starts.extend([0] * grow)
+            self._lengths.extend([0] * grow)
+            self._types.extend(bytes(grow))
+        if self._types[video_id] == MISSING:
+            self._count += 1
+            # Ids arrive in increasing order, so each partition stays sorted;
+            # a hidden id is already in its partition
+            if self._hidden.pop(video_id, None) is None:
+                self._partitions[file_type].append(video_id)
+
+        self._starts[video_id] = len(self._blob)
+        self._lengths[video_id] = len(data)
+        self._types[video_id] = code
+        self._blob += data
+
+    def discard(self, video_id):
+        """Hide video_id from get(); it keeps its place in its partition."""
+        if video_id in self:
+            self._hidden[video_id] = self._types[video_id]
+            self._types[video_id] = MISSING
+            self._count -= 1
+
+    def restore(self, video_id):
+        """Undo discard(); returns False if video_id was not hidden."""
+        code = self._hidden.pop(video_id, None)
+        if code is None:
+            return False
+        self._types[video_id] = code
+        self._count += 1
+        return True
+
+    def partition(self, file_type):
+        """Ids of every row of `file_type`, oldest first; positions never move."""
+        return self._partitions.get(file_type) or array('I')
+
+    def types(self):
+        return [file_type for file_type, ids in self._partitions.items() if ids]
+
+    def get(self, video_id):
+        """Return (file_id, file_type) for video_id, or None if unknown."""
+        if not 0 < video_id < len(self._types):
+            return None
+        code = self._types[video_id]
+        if code == MISSING:
+            return None
+
+        start = self._starts[video_id]
+        data = bytes(self._blob[start:start + self._lengths[video_id]])
+        if code & PACKED:
+            file_id = base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+        else:
+            file_id = data.decode()
+        return file_id, self._type_names[code & ~PACKED]
+
+
+def _pack(file_id):
+    # Telegram file ids are unpadded urlsafe base64; store the raw bytes when
+    # that decodes and re-encodes to exactly the same string.
+    try:
+        data = base64.urlsafe_b64decode(file_id + '=' * (-len(file_id) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    if base64.urlsafe_b64encode(data).rstrip(b'=').decode() != file_id:
+        return None
+    return data
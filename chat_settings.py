@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from background import BackgroundLoop
+from vulgarity import Matcher
+
+logger = logging.getLogger(__name__)
+
+# t1.py is its own bot; its settings live in their own file, apart from the
+# video bot's schema
+DB_PATH = 'chat_settings.db'
+
+
+class ChatSettings:
+    __slots__ = ('block_level', 'words', 'mess_deleted', '_matcher')
+
+    def __init__(self, block_level=0, words=None):
+        self.block_level = block_level
+        # This chat's own filter terms on top of the global list: {term: severity}
+        self.words = words or {}
+        # Whether the last filtered message here was deleted; not persisted
+        self.mess_deleted = False
+        self._matcher = None
+
+    @property
+    def matcher(self):
+        """Matcher over this chat's own words, or None if it has none."""
+        if self._matcher is None and self.words:
+            self._matcher = Matcher(self.words.items())
+        return self._matcher
+
+    def as_row(self):
+        return self.block_level, json.dumps(self.words) if self.words else None
+
+
+# Per-chat moderation settings for t1.py.
+#
+# Every chat's settings live in a dict keyed by chat_id, so the check done on
+# each message is a single dict lookup. A chat is loaded from the
+# chat_settings table the first time it is seen; chats without a row get the
+# defaults, which are cached as well, so an idle group costs one read per
+# process lifetime. Changes are made in memory and the chat is marked dirty; a
+# background task writes all dirty chats in one transaction every
+# flush_interval seconds (sooner once flush_batch are waiting) and once more
+# on stop(). All SQLite work runs on a single dedicated thread.
+class ChatSettingsStore:
+    def __init__(self, path, flush_interval=2.0, flush_batch=500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.loads = 0
+        self._settings = {}
+        self._dirty = set()
+        self._executor = None
+        self._conn = None
+        self._loop = BackgroundLoop()
+
+    def __len__(self):
+        return len(self._settings)
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-settings')
+        await self._submit(self._open)
+        self._loop.start(self._run)
+
+    async def stop(self):
+        if self._executor is None:
+            return
+        await self._loop.stop()
+        await self.flush()
+        await self._submit(self._close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        create_tables(self._conn)
+
+    def _close(self):
+        self._conn.close()
+        self._conn = None
+
+    def _submit(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, fn, *args)
+
+    async def get(self, chat_id):
+        settings = self._settings.get(chat_id)
+        if settings is None:
+            settings = await self._load(chat_id)
+        return settings
+
+    async def _load(self, chat_id):
+        row = await self._submit(load_chat_settings, self._conn, chat_id)
+        self.loads += 1
+        if row is None:
+            settings = ChatSettings()
+        else:
+            block_level, words = row
+            settings = ChatSettings(block_level, json.loads(words) if words else None)
+        # Another handler may have loaded (and changed) it in the meantime
+        return self._settings.setdefault(chat_id, settings)
+
+    def _changed(self, chat_id):
+        self._dirty.add(chat_id)
+        if len(self._dirty) >= self.flush_batch:
+            self._loop.wake()
+
+    async def set_block_level(self, chat_id, block_level):
+        settings = await self.get(chat_id)
+        settings.block_level = block_level
+        self._changed(chat_id)
+        return settings
+
+    async def add_word(self, chat_id, term, severity):
+        settings = await self.get(chat_id)
+        settings.words[term] = severity
+        settings._matcher = None
+        self._changed(chat_id)
+        return settings
+
+    async def remove_word(self, chat_id, term):
+        """Drop one of the chat's own terms; returns False if it had no such term."""
+        settings = await self.get(chat_id)
+        if settings.words.pop(term, None) is None:
+            return False
+        settings._matcher = None
+        self._changed(chat_id)
+        return True
+
+    async def _run(self):
+        while await self._loop.sleep(self.flush_interval):
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to save chat settings: {e}")
+
+    async def flush(self):
+        if not self._dirty:
+            return 0
+        now = int(time.time())
+        dirty, self._dirty = self._dirty, set()
+        rows = [(chat_id, *self._settings[chat_id].as_row(), now) for chat_id in dirty]
+        try:
+            await self._submit(save_chat_settings, self._conn, rows)
+        except sqlite3.Error:
+            # Keep them for the next round
+            self._dirty |= dirty
+            raise
+        logger.info(f"Saved settings for {len(rows)} chats.")
+        return len(rows)
+
+    def stats(self):
+        return {'chats': len(self._settings), 'dirty': len(self._dirty), 'loads': self.loads}
+
+
+def create_tables(conn):
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_settings (
+                chat_id INTEGER PRIMARY KEY,
+                block_level INTEGER NOT NULL DEFAULT 0,
+                words TEXT,
+                updated_at INTEGER NOT NULL
+            )
+        ''')
+
+
+def load_chat_settings(conn, chat_id):
+    """Return (block_level, words) for a chat, or None if it has no row."""
+    return conn.execute(
+        "SELECT block_level, words FROM chat_settings WHERE chat_id = ?", (chat_id,)
+    ).fetchone()
+
+
+def save_chat_settings(conn, rows):
+    with conn:
+        conn.executemany(
+            "INSERT INTO chat_settings (chat_id, block_level, words, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (chat_id) DO UPDATE SET block_level = excluded.block_level, words = excluded.words, "
+            "updated_at = excluded.updated_at",
+            rows
+        )
@@ -1,19 +1,13 @@
 import sqlite3
 
+from migrations import DB_PATH, migrate
+
 # Connect to the SQLite database
-conn = sqlite3.connect('videos.db')
-cursor = conn.cursor()
+conn = sqlite3.connect(DB_PATH)
 
-# Create the videos table
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS videos (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    file_id TEXT NOT NULL
-)
-''')
+# Create or upgrade every table through the shared migration runner
+version = migrate(conn)
 
-# Commit the changes and close the connection
-conn.commit()
 conn.close()
 
-print("Table created successfully!")
+print(f"Tables created successfully (schema version {version})!")
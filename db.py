@@ -0,0 +1,439 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog import Catalog
+from picker import pick_video, save_cursor
+from profiles import DEFAULT_MAX_BYTES, Profile, ProfileCache
+from quarantine import due_probes, quarantine, release, reschedule_probe
+from migrations import migrate
+from payments import PAID, create_payment, due_payments, next_check_at, payment_status, reschedule, settle
+from quota import (DEFAULT_PLAN, SECONDS_PER_DAY, current_day, load_allowed_types, load_plans, prune, refund,
+                   reset_day, try_consume, used_today)
+from seenset import mark_seen
+
+logger = logging.getLogger(__name__)
+
+
+# Data-access layer shared by all bot handlers.
+#
+# A single long-lived sqlite3 connection lives on one dedicated thread and
+# every query is shipped there with run_in_executor, so a slow query or commit
+# never stalls the PTB event loop. Because all statements go through the same
+# thread they are naturally serialized and need no extra locking.
+#
+# Writes come in two flavours. write() commits straight away. write_behind()
+# leaves its statements in the open transaction and a background task commits
+# them as a group every commit_interval seconds, or as soon as commit_batch
+# records are pending, so a burst of deliveries costs one fsync instead of one
+# per video. Every read goes through the same connection and therefore already
+# sees those uncommitted rows, which gives read-your-writes for free.
+#
+# The catalog of (id, file_id, file_type) is loaded once at startup and kept in
+# step with insert_videos, so picking and delivering never touch the videos table.
+# refresh_catalog() picks up rows added by other processes such as backfill.py.
+# Active users' profiles and today's quota usage sit in a bounded LRU in front
+# of the users and user_quota tables; every change writes through to both.
+class Database:
+    def __init__(self, path, commit_interval=0.05, commit_batch=100, profile_cache_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.commit_batch = commit_batch
+        self.catalog = Catalog()
+        self.profiles = ProfileCache(profile_cache_bytes)
+        self.plans = {}
+        self.plan_types = {}
+        self._executor = None
+        self._conn = None
+        self._pending = 0
+        self._dirty = None
+        self._flusher = None
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+        await self._submit(self._open)
+        self._dirty = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._executor is None:
+            return
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self._submit(self._close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        version = migrate(self._conn)
+        logger.info(f"Database schema at version {version}.")
+        count = self.catalog.load(self._conn.cursor())
+        logger.info(f"Loaded {count} catalog entries.")
+        self.plans = load_plans(self._conn)
+        self.plan_types = load_allowed_types(self._conn)
+        # Yesterday's buckets are never read again; clear them out in one go
+        prune(self._conn, current_day())
+        self._conn.commit()
+
+    def _close(self):
+        # Make sure nothing buffered by write_behind is lost on shutdown
+        self._commit()
+        self._conn.close()
+        self._conn = None
+
+    def _submit(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, fn, *args)
+
+    def _commit(self):
+        if self._conn.in_transaction:
+            self._conn.commit()
+        self._pending = 0
+
+    def _call_write(self, fn, args, deferred):
+        conn = self._conn
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        # A failing statement only rolls back its own savepoint, never the
+        # other buffered writes sharing the transaction
+        conn.execute("SAVEPOINT op")
+        try:
+            result = fn(conn, *args)
+        except Exception:
+            conn.execute("ROLLBACK TO op")
+            conn.execute("RELEASE op")
+            raise
+        conn.execute("RELEASE op")
+
+        if not deferred:
+            self._commit()
+        else:
+            self._pending += 1
+            if self._pending >= self.commit_batch:
+                self._commit()
+        return result
+
+    async def _flush_loop(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.commit_interval)
+            self._dirty.clear()
+            try:
+                await self._submit(self._commit)
+            except sqlite3.Error as e:
+                logger.error(f"Group commit failed: {e}")
+
+    async def read(self, fn, *args):
+        """Run fn(conn, *args) on the database thread and return its result."""
+        return await self._submit(fn, self._conn, *args)
+
+    async def write(self, fn, *args):
+        """Like read(), but commit as soon as fn returns."""
+        return await self._submit(self._call_write, fn, args, False)
+
+    async def write_behind(self, fn, *args):
+        """Like write(), but leave the commit to the next group flush."""
+        result = await self._submit(self._call_write, fn, args, True)
+        self._dirty.set()
+        return result
+
+    async def flush(self):
+        await self._submit(self._commit)
+
+    async def add_user(self, user_id):
+        now = int(time.time())
+        created = await self.write(add_user, user_id, now)
+        if created:
+            self.profiles.put(user_id, Profile(DEFAULT_PLAN, now, None, current_day(now), 0))
+        return created
+
+    async def _profile(self, user_id):
+        profile = self.profiles.get(user_id)
+        if profile is None:
+            row = await self.read(get_user, user_id)
+            if row is None:
+                return None
+            profile = Profile(*row)
+            self.profiles.put(user_id, profile)
+        return profile
+
+    async def get_user(self, user_id):
+        """Return (plan, last_access, plan_expires_at), or None for unknown users."""
+        profile = await self._profile(user_id)
+        return profile.as_row() if profile else None
+
+    async def effective_plan(self, user_id, user):
+        """Plan in force right now for a get_user() row.
+
+        The minute sweep downgrades expired plans in bulk; a user whose expiry
+        passed since the last sweep is caught here by comparing the cached
+        expiry, so the common case costs no query.
+        """
+        plan, _, plan_expires_at = user
+        if plan_expires_at is not None and plan_expires_at <= time.time():
+            await self.check_plan_expiration(user_id)
+            return DEFAULT_PLAN
+        return plan
+
+    def allowed_types(self, plan):
+        """File types `plan` may receive, or None for every type."""
+        if plan in self.plan_types:
+            return self.plan_types[plan]
+        return self.plan_types.get(DEFAULT_PLAN)
+
+    def daily_limit(self, plan):
+        daily_limit, _ = self.plans.get(plan) or self.plans[DEFAULT_PLAN]
+        return daily_limit
+
+    async def consume_quota(self, user_id, plan):
+        """Take one video from today's quota; returns (used or None, limit, day)."""
+        day = current_day()
+        limit = self.daily_limit(plan)
+
+        # A user already known to be at the limit is turned away from memory
+        profile = self.profiles.peek(user_id)
+        if profile is not None and profile.day == day and profile.used is not None and profile.used >= limit:
+            return None, limit, day
+
+        used = await self.write_behind(try_consume, user_id, limit, day)
+        profile = self.profiles.peek(user_id)
+        if profile is not None:
+            if profile.day != day or profile.used is None:
+                profile.day, profile.used = day, used if used is not None else limit
+            else:
+                # Concurrent consumes may resume out of order; keep the highest count
+                profile.used = max(profile.used, used if used is not None else limit)
+        return used, limit, day
+
+    async def refund_quota(self, user_id, day):
+        await self.write_behind(refund, user_id, day)
+        profile = self.profiles.peek(user_id)
+        if profile is not None and profile.day == day and profile.used:
+            profile.used -= 1
+
+    async def quota_status(self, user_id, plan):
+        """Return (used, limit) for today without writing anything."""
+        day = current_day()
+        profile = await self._profile(user_id)
+        if profile is not None and profile.day == day and profile.used is not None:
+            return profile.used, self.daily_limit(plan)
+
+        used = await self.read(used_today, user_id, day)
+        profile = self.profiles.peek(user_id)
+        if profile is not None and (profile.day != day or profile.used is None):
+            profile.day, profile.used = day, used
+        return used, self.daily_limit(plan)
+
+    def _insert_videos(self, conn, rows):
+        added = insert_videos(conn, rows)
+        # Load through the new ids rather than adding just ours, so rows a
+        # backfill committed before them land first and partitions stay in
+        # id order, as they will be after a restart
+        self.catalog.load(conn.cursor(), self.catalog.max_id)
+        return len(added)
+
+    async def insert_videos(self, rows):
+        """Insert (file_id, file_unique_id, file_type) rows in one transaction; returns how many were new."""
+        return await self.write(self._insert_videos, rows)
+
+    def _refresh_catalog(self, conn):
+        return self.catalog.load(conn.cursor(), self.catalog.max_id)
+
+    async def refresh_catalog(self):
+        """Pick up rows other processes (backfill.py) added; returns how many were new."""
+        return await self.read(self._refresh_catalog)
+
+    def _pick_videos(self, conn, user_id, file_types, count, states, exclude):
+        states = dict(states or {})
+        exclude = set(exclude)
+        picks = []
+        for _ in range(count):
+            picked = pick_video(conn.cursor(), user_id, self.catalog, file_types, states, exclude)
+            if picked is None:
+                break
+            video_id, _, file_type, state = picked
+            # Each pick continues from the previous one's cursor
+            states[file_type] = state
+            exclude.add(video_id)
+            picks.append(picked)
+        return picks
+
+    async def pick_videos(self, user_id, file_types, count, states=None, exclude=()):
+        """Pick up to count items in a row, continuing from `states`; see picker.pick_video.
+
+        Returns a list of (video_id, file_id, file_type, cursor); an exhausted
+        stored cursor is saved so the next tap skips the scan.
+        """
+        return await self.write_behind(self._pick_videos, user_id, file_types, count, states, exclude)
+
+    def _quarantine_video(self, conn, video_id, reason, now):
+        quarantine(conn, video_id, reason, now)
+        self.catalog.discard(video_id)
+
+    async def quarantine_video(self, video_id, reason):
+        """Take a video out of selection until revalidation says otherwise."""
+        return await self.write(self._quarantine_video, video_id, reason, int(time.time()))
+
+    async def due_probes(self, now, limit):
+        return await self.read(due_probes, now, limit)
+
+    async def reschedule_probe(self, video_id, probes, next_probe_at, status='suspect'):
+        return await self.write(reschedule_probe, video_id, probes, next_probe_at, status)
+
+    def _restore_video(self, conn, video_id):
+        released = release(conn, video_id)
+        if released:
+            # Back in the same partition position it never left
+            self.catalog.restore(video_id)
+        return released
+
+    async def restore_video(self, video_id):
+        return await self.write(self._restore_video, video_id)
+
+    async def record_delivery(self, user_id, video_id, video_cursor):
+        now = int(time.time())
+        await self.write_behind(record_delivery, user_id, video_id, video_cursor, now)
+        profile = self.profiles.peek(user_id)
+        if profile is not None:
+            profile.last_access = now
+
+    async def create_payment(self, transaction_id, user_id, chat_id, plan, first_check, timeout):
+        now = int(time.time())
+        return await self.write(create_payment, transaction_id, user_id, chat_id, plan,
+                                now, now + first_check, now + timeout)
+
+    async def due_payments(self, now, limit):
+        return await self.read(due_payments, now, limit)
+
+    async def next_payment_check(self):
+        return await self.read(next_check_at)
+
+    async def payment_status(self, transaction_id):
+        return await self.read(payment_status, transaction_id)
+
+    async def reschedule_payment(self, transaction_id, attempts, check_at):
+        return await self.write(reschedule, transaction_id, attempts, check_at)
+
+    def _settle_payment(self, conn, transaction_id, status, now):
+        row = settle(conn, transaction_id, status, now)
+        if row is None:
+            return None
+        user_id, chat_id, plan = row
+        expires_at = None
+        if status == PAID:
+            # Same transaction as the status change, so the upgrade happens once
+            _, duration_days = self.plans[plan]
+            expires_at = update_user_plan(conn, user_id, plan, duration_days, now)
+        return user_id, chat_id, plan, expires_at
+
+    async def settle_payment(self, transaction_id, status):
+        """Close an open payment; returns (user_id, chat_id, plan, expires_at), or None if already closed."""
+        now = int(time.time())
+        settled = await self.write(self._settle_payment, transaction_id, status, now)
+        if settled is not None and status == PAID:
+            user_id, _, plan, expires_at = settled
+            profile = self.profiles.peek(user_id)
+            if profile is not None:
+                profile.plan, profile.last_access, profile.plan_expires_at = plan, now, expires_at
+                profile.day, profile.used = current_day(now), 0
+        return settled
+
+    async def check_plan_expiration(self, user_id):
+        expired = await self.write(check_plan_expiration, user_id)
+        if expired:
+            profile = self.profiles.peek(user_id)
+            if profile is not None:
+                profile.plan, profile.plan_expires_at = DEFAULT_PLAN, None
+        return expired
+
+    async def expire_plans(self):
+        """Downgrade every plan that has run out; returns how many were downgraded."""
+        expired = await self.write(expire_plans, int(time.time()))
+        for user_id in expired:
+            profile = self.profiles.peek(user_id)
+            if profile is not None:
+                profile.plan, profile.plan_expires_at = DEFAULT_PLAN, None
+        return len(expired)
+
+
+def add_user(conn, user_id, now):
+    """Insert a new free user, returning False if they already exist."""
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO users (user_id, plan, daily_count, last_access) VALUES (?, ?, ?, ?)",
+        (user_id, DEFAULT_PLAN, 0, now)
+    )
+    return cursor.rowcount > 0
+
+
+def get_user(conn, user_id):
+    cursor = conn.execute(
+        "SELECT plan, last_access, plan_expires_at FROM users WHERE user_id = ?",
+        (user_id,)
+    )
+    return cursor.fetchone()
+
+
+def insert_videos(conn, rows):
+    """Insert media, skipping any whose file_unique_id is already stored; returns the new rows."""
+    added = []
+    for file_id, file_unique_id, file_type in rows:
+        row = conn.execute(
+            "INSERT INTO videos (file_id, file_unique_id, file_type) VALUES (?, ?, ?) "
+            "ON CONFLICT (file_unique_id) DO NOTHING RETURNING id",
+            (file_id, file_unique_id, file_type)
+        ).fetchone()
+        if row is not None:
+            added.append((row[0], file_id, file_type))
+    return added
+
+
+def record_delivery(conn, user_id, video_id, video_cursor, now):
+    cursor = conn.cursor()
+    # The quota was already taken by consume_quota; just note the access time
+    cursor.execute("UPDATE users SET last_access = ? WHERE user_id = ?", (now, user_id))
+    mark_seen(cursor, user_id, video_id)
+    save_cursor(cursor, user_id, video_cursor)
+
+
+def update_user_plan(conn, user_id, plan, duration_days, current_time):
+    expires_at = current_time + duration_days * SECONDS_PER_DAY if duration_days else None
+
+    conn.execute(
+        "UPDATE users SET plan = ?, last_access = ?, plan_expires_at = ? WHERE user_id = ?",
+        (plan, current_time, expires_at, user_id)
+    )
+    # A fresh plan starts with a full allowance for today
+    reset_day(conn, user_id, current_day(current_time))
+    return expires_at
+
+
+def check_plan_expiration(conn, user_id):
+    cursor = conn.execute(
+        "UPDATE users SET plan = 'free', plan_expires_at = NULL "
+        "WHERE user_id = ? AND plan_expires_at <= ?",
+        (user_id, int(time.time()))
+    )
+    if cursor.rowcount > 0:
+        logger.info(f"User {user_id}'s plan expired. Resetting to 'free'.")
+        return True
+    return False
+
+
+def expire_plans(conn, now):
+    """Reset all expired plans to free in one range scan over idx_users_plan_expires_at."""
+    rows = conn.execute(
+        "UPDATE users SET plan = ?, plan_expires_at = NULL WHERE plan_expires_at <= ? RETURNING user_id",
+        (DEFAULT_PLAN, now)
+    ).fetchall()
+    return [user_id for user_id, in rows]
@@ -0,0 +1,92 @@
+import argparse
+import base64
+import json
+import logging
+
+import httpx
+from aiohttp import web
+
+from payments import VERIFY_HEADER, xverify
+
+logger = logging.getLogger(__name__)
+
+# Gateway status strings reported by the fake status API, per callback code
+STATUS_FOR_CODE = {
+    'PAYMENT_SUCCESS': 'success',
+    'PAYMENT_ERROR': 'failed',
+    'PAYMENT_DECLINED': 'declined',
+    'PAYMENT_PENDING': 'pending',
+}
+
+
+# Local stand-in for the UPI gateway, for exercising the bot's payment paths.
+#
+# It serves the status API the PaymentWorker polls
+# (GET /api/v1/transactions/{transaction_id}/status) and, when told to settle
+# a transaction with POST /pay/{transaction_id}?code=PAYMENT_SUCCESS, pushes
+# a signed callback to the bot exactly like the real gateway would. Point the
+# bot at it with
+#   PAYMENT_STATUS_URL=http://127.0.0.1:9000/api/v1/transactions/{transaction_id}/status
+# and the same PAYMENT_SALT_KEY / PAYMENT_SALT_INDEX.
+def build_app(callback_url, salt_key, salt_index):
+    app = web.Application()
+    statuses = {}
+
+    async def transaction_status(request):
+        transaction_id = request.match_info['transaction_id']
+        if transaction_id not in statuses:
+            return web.Response(status=404)
+        return web.json_response({'transactionId': transaction_id, 'status': statuses[transaction_id]})
+
+    async def pay(request):
+        transaction_id = request.match_info['transaction_id']
+        code = request.query.get('code', 'PAYMENT_SUCCESS')
+        statuses[transaction_id] = STATUS_FOR_CODE.get(code, 'pending')
+
+        # Callbacks can be repeated to check the bot handles duplicates
+        repeat = int(request.query.get('repeat', '1'))
+        results = []
+        if callback_url:
+            async with httpx.AsyncClient(timeout=10) as client:
+                for _ in range(repeat):
+                    results.append(await send_callback(client, callback_url, transaction_id, code,
+                                                       salt_key, salt_index))
+        return web.json_response({'transactionId': transaction_id, 'status': statuses[transaction_id],
+                                  'callbacks': results})
+
+    app.router.add_get('/api/v1/transactions/{transaction_id}/status', transaction_status)
+    app.router.add_post('/pay/{transaction_id}', pay)
+    return app
+
+
+async def send_callback(client, url, transaction_id, code, salt_key, salt_index):
+    notification = {
+        'success': code == 'PAYMENT_SUCCESS',
+        'code': code,
+        'data': {'merchantTransactionId': transaction_id},
+    }
+    payload = base64.b64encode(json.dumps(notification).encode()).decode()
+    response = await client.post(url, json={'response': payload},
+                                 headers={VERIFY_HEADER: xverify(payload, salt_key, salt_index)})
+    logger.info(f"Callback for {transaction_id} ({code}): HTTP {response.status_code}")
+    return response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake UPI gateway for local payment testing.")
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--callback-url', default='http://127.0.0.1:8443/payments/callback',
+                        help="the bot's payment callback endpoint; empty to disable callbacks")
+    parser.add_argument('--salt-key', default='test-salt')
+    parser.add_argument('--salt-index', default='1')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    web.run_app(build_app(args.callback_url, args.salt_key, args.salt_index), host='127.0.0.1', port=args.port)
+
+
+if __name__ == '__main__':
+    main()
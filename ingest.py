@@ -0,0 +1,119 @@
+import logging
+import time
+from collections import deque
+
+from background import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+
+
+def media_from_message(message):
+    """Return (file_id, file_unique_id, file_type) for the media in a post, or None."""
+    if message.video:
+        media, file_type = message.video, "Video"
+    elif message.photo:
+        # Get the highest resolution photo
+        media, file_type = message.photo[-1], "Photo"
+    elif message.document:
+        media, file_type = message.document, "Document"
+    elif message.audio:
+        media, file_type = message.audio, "Audio"
+    elif message.voice:
+        media, file_type = message.voice, "Voice Message"
+    elif message.sticker:
+        media, file_type = message.sticker, "Sticker"
+    else:
+        return None
+    return media.file_id, media.file_unique_id, file_type
+
+
+# Buffered ingest of media posted to the video channel.
+#
+# handle_video only calls add(), which queues the post and returns. A
+# background task writes everything queued every `interval` seconds, or as
+# soon as `batch_size` posts are waiting, in a single transaction. Telegram
+# delivers the parts of an album as separate updates, so parts sharing a
+# media_group_id are held until none has arrived for `album_wait` seconds and
+# then written together, never split across batches. Reposts of media we
+# already have are dropped by the unique index on file_unique_id.
+class IngestQueue:
+    def __init__(self, db, interval=1.0, batch_size=500, album_wait=1.5):
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.album_wait = album_wait
+        self.added = 0
+        self.duplicates = 0
+        # Groups of rows that must be written together: single posts or whole albums
+        self._ready = deque()
+        self._ready_rows = 0
+        self._albums = {}
+        self._loop = BackgroundLoop()
+
+    def __len__(self):
+        return self._ready_rows + sum(len(parts) for _, parts in self._albums.values())
+
+    def add(self, message):
+        """Queue the media in a channel post; returns False if it has none."""
+        media = media_from_message(message)
+        if media is None:
+            return False
+
+        group_id = message.media_group_id
+        if group_id:
+            _, parts = self._albums.get(group_id, (None, []))
+            parts.append(media)
+            self._albums[group_id] = (time.monotonic(), parts)
+        else:
+            self._ready.append([media])
+            self._ready_rows += 1
+
+        if self._ready_rows >= self.batch_size:
+            self._loop.wake()
+        return True
+
+    def start(self):
+        self._loop.start(self._run)
+
+    async def stop(self):
+        await self._loop.stop()
+        # Write out everything still queued, including albums still filling up
+        await self.flush(force=True)
+
+    async def _run(self):
+        while await self._loop.sleep(self.interval):
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to store ingested media: {e}")
+
+    def _release_albums(self, force):
+        cutoff = time.monotonic() - self.album_wait
+        for group_id, (last_seen, parts) in list(self._albums.items()):
+            if force or last_seen <= cutoff:
+                del self._albums[group_id]
+                self._ready.append(parts)
+                self._ready_rows += len(parts)
+
+    async def flush(self, force=False):
+        self._release_albums(force)
+        while self._ready:
+            groups = []
+            rows = []
+            while self._ready and (not rows or len(rows) + len(self._ready[0]) <= self.batch_size):
+                groups.append(self._ready.popleft())
+                rows.extend(groups[-1])
+            self._ready_rows -= len(rows)
+            try:
+                added = await self.db.insert_videos(rows)
+            except Exception:
+                # Put them back at the front for the next round
+                self._ready.extendleft(reversed(groups))
+                self._ready_rows += len(rows)
+                raise
+            self.added += added
+            self.duplicates += len(rows) - added
+            logger.info(f"Stored {added} new media ({len(rows) - added} already known).")
+
+    def stats(self):
+        return {'queued': len(self), 'added': self.added, 'duplicates': self.duplicates}
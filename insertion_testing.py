@@ -2,6 +2,7 @@ import sqlite3
 import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext
+from migrations import DB_PATH, migrate
 
 # Enable logging
 logging.basicConfig(
@@ -12,16 +13,8 @@ logger = logging.getLogger(__name__)
 
 # Function to set up the database
 def setup_database():
-    conn = sqlite3.connect('videos.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            file_id TEXT NOT NULL,
-            file_type TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
+    conn = sqlite3.connect(DB_PATH)
+    migrate(conn)
     conn.close()
 
 # Function to handle /get_file_id command or incoming messages from the specified channel
@@ -58,9 +51,9 @@ async def get_file_id(update: Update, context: CallbackContext) -> None:
 
             if file_id:
                 # Insert file_id and file_type into the database
-                conn = sqlite3.connect('videos.db')
+                conn = sqlite3.connect(DB_PATH)
                 cursor = conn.cursor()
-                cursor.execute("INSERT INTO videos (file_id) VALUES (?)", (file_id,))
+                cursor.execute("INSERT INTO videos (file_id, file_type) VALUES (?, ?)", (file_id, file_type))
                 conn.commit()
                 conn.close()
 
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+# Statuses that mean the user is not (or no longer) in the channel
+NOT_MEMBER = ('left', 'kicked')
+
+POSITIVE_TTL = 300
+NEGATIVE_TTL = 15
+
+
+def chat_key(chat):
+    """Normalise '@Name', 'name' and numeric ids so they share cache entries."""
+    if isinstance(chat, str):
+        return chat.lstrip('@').lower()
+    return chat
+
+
+# Cache of get_chat_member results for channel gates.
+#
+# Members are trusted for `positive_ttl` seconds; non-members only for
+# `negative_ttl`, so someone who just joined is let in quickly even if the
+# chat_member update never reaches us. ChatMemberHandler updates overwrite
+# entries as soon as they arrive. Concurrent lookups for the same (chat, user)
+# share one API call. Only touched from the event loop thread.
+class MembershipCache:
+    def __init__(self, positive_ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL, max_entries=50000):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key, is_member, now=None):
+        now = time.monotonic() if now is None else now
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        self._entries[key] = (now + ttl, is_member)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, chat, user_id):
+        """Return the cached membership, or None if unknown or expired."""
+        key = (chat_key(chat), user_id)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def update(self, chat, user_id, status):
+        """Record a membership status seen in a chat_member update."""
+        self._store((chat_key(chat), user_id), status not in NOT_MEMBER)
+
+    def invalidate(self, chat, user_id):
+        self._entries.pop((chat_key(chat), user_id), None)
+
+    async def is_member(self, bot, chat, user_id):
+        """Check membership through the cache; API errors propagate and are not cached."""
+        key = (chat_key(chat), user_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            member = await bot.get_chat_member(chat, user_id)
+            is_member = member.status not in NOT_MEMBER
+            self._store(key, is_member)
+            future.set_result(is_member)
+            return is_member
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; keep asyncio from warning about it
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+            if not future.done():
+                # We were cancelled mid-lookup; don't leave the waiters hanging
+                future.cancel()
+
+    async def missing(self, bot, chats, user_id):
+        """Return the chats in `chats` the user has not joined, checking all of them concurrently."""
+        results = await asyncio.gather(*(self.is_member(bot, chat, user_id) for chat in chats))
+        return [chat for chat, joined in zip(chats, results) if not joined]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hit_rate, 4),
+        }
@@ -0,0 +1,299 @@
+import logging
+import sqlite3
+import time
+
+from seenset import migrate_user_videos
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'videos.db'
+
+
+# Numbered schema migrations shared by the bot and every helper script.
+#
+# The applied version is recorded in schema_version. Each migration runs once,
+# in order, and must cope with databases created by the older ad-hoc
+# init_db/create.py/setup_database code, which never recorded a version. Where
+# possible a migration only adds columns or indexes, which SQLite does without
+# rewriting the table, so it is safe to apply while the bot starts up.
+def _create_base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id TEXT NOT NULL,
+            file_type TEXT NOT NULL DEFAULT 'Video'
+        )
+    ''')
+    # create.py and populate_videos.py created videos without file_type
+    if 'file_type' not in _columns(conn, 'videos'):
+        conn.execute("ALTER TABLE videos ADD COLUMN file_type TEXT NOT NULL DEFAULT 'Video'")
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            plan TEXT NOT NULL,
+            daily_count INTEGER NOT NULL,
+            last_access INTEGER NOT NULL,
+            plan_expires_at INTEGER
+        )
+    ''')
+
+
+def _create_seen_sets(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_seen (
+            user_id INTEGER PRIMARY KEY,
+            seen BLOB NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_cursors (
+            user_id INTEGER PRIMARY KEY,
+            seed INTEGER NOT NULL,
+            lo INTEGER NOT NULL,
+            hi INTEGER NOT NULL,
+            pos INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    ''')
+    migrated = migrate_user_videos(conn.cursor())
+    if migrated:
+        logger.info(f"Migrated {migrated} user_videos rows into user_seen.")
+
+
+def _epoch_timestamps(conn, batch_size=5000):
+    """Convert users.last_access to epoch seconds and add plan_expires_at.
+
+    Older rows hold whatever sqlite3's datetime adapter wrote, with or without
+    a UTC offset; naive values were always written in UTC. Databases whose
+    last_access column was declared TEXT get the (small) users table rebuilt
+    once, since TEXT affinity would turn integers back into strings. After
+    that, stray text values are converted in committed batches so the bot can
+    keep serving while a large table converts.
+    """
+    epoch = "COALESCE(CAST(strftime('%s', last_access) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))"
+    columns = _columns(conn, 'users')
+
+    if columns.get('last_access') != 'INTEGER':
+        expires = 'plan_expires_at' if 'plan_expires_at' in columns else 'NULL'
+        conn.execute("""
+            CREATE TABLE users_new (
+                user_id INTEGER PRIMARY KEY,
+                plan TEXT NOT NULL,
+                daily_count INTEGER NOT NULL,
+                last_access INTEGER NOT NULL,
+                plan_expires_at INTEGER
+            )
+        """)
+        cursor = conn.execute(f"""
+            INSERT INTO users_new (user_id, plan, daily_count, last_access, plan_expires_at)
+            SELECT user_id, plan, daily_count,
+                   CASE WHEN typeof(last_access) = 'text' THEN {epoch} ELSE last_access END,
+                   {expires}
+            FROM users
+        """)
+        conn.execute("DROP TABLE users")
+        conn.execute("ALTER TABLE users_new RENAME TO users")
+        conn.commit()
+        logger.info(f"Converted {cursor.rowcount} users to epoch timestamps.")
+        return
+
+    if 'plan_expires_at' not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN plan_expires_at INTEGER")
+        conn.commit()
+
+    while True:
+        cursor = conn.execute(f"""
+            UPDATE users SET last_access = {epoch}
+            WHERE rowid IN (
+                SELECT rowid FROM users WHERE typeof(last_access) = 'text' LIMIT ?
+            )
+        """, (batch_size,))
+        conn.commit()
+        if cursor.rowcount <= 0:
+            return
+
+
+def _hot_path_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_last_access ON users (last_access)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_plan_expires_at ON users (plan_expires_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_file_id ON videos (file_id)")
+
+
+def _day_bucket_quota(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS plans (
+            name TEXT PRIMARY KEY,
+            daily_limit INTEGER NOT NULL,
+            duration_days INTEGER
+        )
+    ''')
+    conn.executemany(
+        "INSERT OR IGNORE INTO plans (name, daily_limit, duration_days) VALUES (?, ?, ?)",
+        [('free', 3, None), ('paid', 200, 29)]
+    )
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_quota (
+            user_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            used INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_quota_day ON user_quota (day)")
+    # Carry over what users already consumed today under the old daily_count
+    conn.execute('''
+        INSERT OR IGNORE INTO user_quota (user_id, day, used)
+        SELECT user_id, last_access / 86400, daily_count FROM users
+        WHERE daily_count > 0 AND last_access / 86400 = CAST(strftime('%s', 'now') AS INTEGER) / 86400
+    ''')
+
+
+def _pending_payments(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pending_payments (
+            transaction_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            plan TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at INTEGER NOT NULL,
+            next_check_at INTEGER NOT NULL,
+            deadline INTEGER NOT NULL,
+            settled_at INTEGER
+        )
+    ''')
+    # The worker only ever scans open payments by due time
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pending_payments_due ON pending_payments (next_check_at) "
+        "WHERE status = 'pending'"
+    )
+
+
+def _file_unique_ids(conn):
+    if 'file_unique_id' not in _columns(conn, 'videos'):
+        conn.execute("ALTER TABLE videos ADD COLUMN file_unique_id TEXT")
+    # Rows ingested before this migration have NULL here and never conflict
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_videos_file_unique_id ON videos (file_unique_id)")
+
+
+def _typed_cursors(conn):
+    # Cursors now walk per-type partitions instead of the id range. They are
+    # only a shortcut over the seen-sets, so the old ones are simply dropped.
+    conn.execute("DROP TABLE IF EXISTS user_cursors")
+    conn.execute('''
+        CREATE TABLE user_cursors (
+            user_id INTEGER NOT NULL,
+            file_type TEXT NOT NULL,
+            seed INTEGER NOT NULL,
+            lo INTEGER NOT NULL,
+            hi INTEGER NOT NULL,
+            pos INTEGER NOT NULL,
+            PRIMARY KEY (user_id, file_type)
+        ) WITHOUT ROWID
+    ''')
+    # Comma-separated file types a plan may receive; NULL allows every type
+    if 'allowed_types' not in _columns(conn, 'plans'):
+        conn.execute("ALTER TABLE plans ADD COLUMN allowed_types TEXT")
+
+
+def _video_quarantine(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS video_quarantine (
+            video_id INTEGER PRIMARY KEY,
+            reason TEXT NOT NULL,
+            status TEXT NOT NULL,
+            probes INTEGER NOT NULL DEFAULT 0,
+            quarantined_at INTEGER NOT NULL,
+            next_probe_at INTEGER NOT NULL,
+            FOREIGN KEY (video_id) REFERENCES videos(id)
+        )
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_video_quarantine_probe ON video_quarantine (next_probe_at) "
+        "WHERE status = 'suspect'"
+    )
+
+
+def _legacy_plan_expiry(conn):
+    # Paid rows written before plan_expires_at existed have it NULL, which the
+    # expiry sweep never matches. Their purchase time is unknown; last_access
+    # is the latest it can have been, so expire them a plan length after that.
+    cursor = conn.execute('''
+        UPDATE users SET plan_expires_at = last_access + 86400 * (
+            SELECT duration_days FROM plans WHERE plans.name = users.plan
+        )
+        WHERE plan_expires_at IS NULL
+          AND plan IN (SELECT name FROM plans WHERE duration_days IS NOT NULL)
+    ''')
+    if cursor.rowcount > 0:
+        logger.info(f"Gave {cursor.rowcount} legacy paid users an expiry date.")
+
+
+MIGRATIONS = [
+    (1, 'base tables', _create_base_tables),
+    (2, 'per-user seen-sets and cursors', _create_seen_sets),
+    (3, 'epoch timestamps', _epoch_timestamps),
+    (4, 'hot path indexes', _hot_path_indexes),
+    (5, 'plans and day-bucket quotas', _day_bucket_quota),
+    (6, 'pending payments', _pending_payments),
+    (7, 'unique media ids', _file_unique_ids),
+    (8, 'per-type cursors and plan media types', _typed_cursors),
+    (9, 'video quarantine', _video_quarantine),
+    # 10 was the chat_settings table, which now lives in t1.py's own database.
+    # Never reuse a number: databases that applied it already record it.
+    (11, 'expiry for legacy paid plans', _legacy_plan_expiry),
+]
+
+
+def _columns(conn, table):
+    return {row[1]: row[2].upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def current_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at INTEGER NOT NULL
+        )
+    ''')
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn):
+    """Apply every pending migration and return the resulting schema version."""
+    version = current_version(conn)
+    conn.commit()
+
+    for number, name, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        logger.info(f"Applying migration {number}: {name}")
+        try:
+            conn.execute("BEGIN")
+            apply(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                (number, name, int(time.time()))
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            logger.error(f"Migration {number} ({name}) failed.")
+            raise
+        version = number
+    return version
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    conn = sqlite3.connect(DB_PATH)
+    print(f"Database is at schema version {migrate(conn)}.")
+    conn.close()
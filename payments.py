@@ -0,0 +1,256 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+
+import httpx
+from aiohttp import web
+
+from background import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+PAID = 'paid'
+FAILED = 'failed'
+EXPIRED = 'expired'
+
+# Gateway status strings, mapped onto our own; anything else means "not yet"
+GATEWAY_STATUSES = {
+    'success': PAID,
+    'captured': PAID,
+    'completed': PAID,
+    'failed': FAILED,
+    'declined': FAILED,
+    'cancelled': FAILED,
+}
+
+# Response codes carried by the gateway's server-to-server callbacks
+CALLBACK_CODES = {
+    'PAYMENT_SUCCESS': PAID,
+    'PAYMENT_ERROR': FAILED,
+    'PAYMENT_DECLINED': FAILED,
+    'TIMED_OUT': FAILED,
+}
+
+VERIFY_HEADER = 'X-VERIFY'
+
+
+# Async client for the gateway's transaction status API, sharing one
+# connection pool across all checks.
+class GatewayClient:
+    def __init__(self, status_url, api_key, timeout=10.0, max_connections=20):
+        # status_url is a template with a {transaction_id} placeholder
+        self.status_url = status_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    def start(self):
+        self._client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_connections)
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def status(self, transaction_id):
+        """Return PAID, FAILED, or None while the payment is still open."""
+        response = await self._client.get(self.status_url.format(transaction_id=transaction_id))
+        if response.status_code == 404:
+            # The gateway only knows about the transaction once the user starts paying
+            return None
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, dict):
+            raise ValueError(f"expected an object, got {type(data).__name__}")
+        return GATEWAY_STATUSES.get(str(data.get('status', '')).lower())
+
+
+# Background verification of UPI payments.
+#
+# plan_selected only records the purchase in pending_payments and returns. One
+# PaymentWorker task polls the gateway for every open payment that is due,
+# backing off exponentially per payment until it is paid, failed, or past its
+# deadline. Settling is a conditional UPDATE on status = 'pending' done in the
+# same transaction as the plan upgrade, so each purchase upgrades the plan
+# exactly once. Open payments live in the database, so a restart just picks
+# them up again.
+class PaymentWorker:
+    def __init__(self, db, gateway, first_check=20, max_interval=300, timeout=1800, concurrency=20, batch=100):
+        self.db = db
+        self.gateway = gateway
+        self.first_check = first_check
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.batch = batch
+        self._slots = asyncio.Semaphore(concurrency)
+        self._on_settled = None
+        self._loop = BackgroundLoop()
+
+    def start(self, on_settled):
+        # Called as on_settled(transaction_id, status, user_id, chat_id, plan)
+        self._on_settled = on_settled
+        self.gateway.start()
+        self._loop.start(self._run)
+
+    async def stop(self):
+        await self._loop.stop()
+        await self.gateway.aclose()
+
+    async def submit(self, transaction_id, user_id, chat_id, plan):
+        """Record a new purchase; the worker starts checking it after first_check seconds."""
+        created = await self.db.create_payment(transaction_id, user_id, chat_id, plan,
+                                               self.first_check, self.timeout)
+        self._loop.wake()
+        return created
+
+    async def _run(self):
+        while self._loop.running:
+            try:
+                now = int(time.time())
+                due = await self.db.due_payments(now, self.batch)
+                if due:
+                    await asyncio.gather(*(self._check(*row) for row in due))
+                    continue
+
+                next_check = await self.db.next_payment_check()
+                wait = self.max_interval if next_check is None else min(max(next_check - now, 0), self.max_interval)
+                await self._loop.sleep(wait)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Payment worker error: {e}")
+                await asyncio.sleep(5)
+
+    async def _check(self, transaction_id, attempts, deadline):
+        async with self._slots:
+            try:
+                status = await self.gateway.status(transaction_id)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"Payment status check for {transaction_id} failed: {e}")
+                status = None
+
+        now = int(time.time())
+        if status is None and now >= deadline:
+            status = EXPIRED
+        if status is None:
+            delay = min(self.first_check * 2 ** attempts, self.max_interval)
+            await self.db.reschedule_payment(transaction_id, attempts + 1, now + delay)
+            return
+
+        await self.settle(transaction_id, status)
+
+    async def settle(self, transaction_id, status):
+        """Close an open payment and tell the user; returns False if it was not open."""
+        settled = await self.db.settle_payment(transaction_id, status)
+        if settled is None:
+            # Already settled by the other path (poll or callback), or unknown
+            return False
+        user_id, chat_id, plan, _ = settled
+        logger.info(f"Payment {transaction_id} for user {user_id} settled as {status}.")
+        try:
+            await self._on_settled(transaction_id, status, user_id, chat_id, plan)
+        except Exception as e:
+            logger.error(f"Failed to notify user {user_id} about payment {transaction_id}: {e}")
+        return True
+
+
+def xverify(payload, salt_key, salt_index):
+    """X-VERIFY value for a base64 payload: sha256(payload + salt_key) + '###' + salt_index."""
+    digest = hashlib.sha256(f"{payload}{salt_key}".encode()).hexdigest()
+    return f"{digest}###{salt_index}"
+
+
+# Server-to-server payment notifications.
+#
+# The gateway POSTs {"response": <base64 JSON>} with an X-VERIFY header. Once
+# the signature checks out, the payment is settled through the same
+# conditional update the worker uses, so a callback racing a poll, or the
+# gateway retrying a callback, still upgrades the plan only once. Pending
+# notifications are acknowledged and otherwise ignored.
+def callback_routes(worker, path, salt_key, salt_index):
+    async def receive_callback(request):
+        try:
+            payload = (await request.json())['response']
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400)
+
+        signature = request.headers.get(VERIFY_HEADER, '')
+        if not hmac.compare_digest(signature.encode(), xverify(payload, salt_key, salt_index).encode()):
+            logger.warning(f"Rejected payment callback from {request.remote}: bad signature")
+            return web.Response(status=403)
+
+        try:
+            notification = json.loads(base64.b64decode(payload))
+            transaction_id = notification['data']['merchantTransactionId']
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400)
+
+        status = CALLBACK_CODES.get(notification.get('code'))
+        if status is None:
+            return web.json_response({'ok': True})
+
+        if not await worker.settle(transaction_id, status):
+            if await worker.db.payment_status(transaction_id) is None:
+                logger.warning(f"Payment callback for unknown transaction {transaction_id}")
+                return web.Response(status=404)
+            logger.debug(f"Duplicate payment callback for {transaction_id}")
+        return web.json_response({'ok': True})
+
+    return [web.post(path, receive_callback)]
+
+
+def create_payment(conn, transaction_id, user_id, chat_id, plan, now, first_check_at, deadline):
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO pending_payments "
+        "(transaction_id, user_id, chat_id, plan, created_at, next_check_at, deadline) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (transaction_id, user_id, chat_id, plan, now, first_check_at, deadline)
+    )
+    return cursor.rowcount > 0
+
+
+def due_payments(conn, now, limit):
+    """Return [(transaction_id, attempts, deadline)] for open payments due by now."""
+    return conn.execute(
+        "SELECT transaction_id, attempts, deadline FROM pending_payments "
+        "WHERE status = 'pending' AND next_check_at <= ? ORDER BY next_check_at LIMIT ?",
+        (now, limit)
+    ).fetchall()
+
+
+def next_check_at(conn):
+    row = conn.execute("SELECT MIN(next_check_at) FROM pending_payments WHERE status = 'pending'").fetchone()
+    return row[0]
+
+
+def payment_status(conn, transaction_id):
+    row = conn.execute("SELECT status FROM pending_payments WHERE transaction_id = ?", (transaction_id,)).fetchone()
+    return row[0] if row else None
+
+
+def reschedule(conn, transaction_id, attempts, check_at):
+    conn.execute(
+        "UPDATE pending_payments SET attempts = ?, next_check_at = ? "
+        "WHERE transaction_id = ? AND status = 'pending'",
+        (attempts, check_at, transaction_id)
+    )
+
+
+def settle(conn, transaction_id, status, now):
+    """Move an open payment to `status`; returns (user_id, chat_id, plan), or None if it was not open."""
+    return conn.execute(
+        "UPDATE pending_payments SET status = ?, settled_at = ? "
+        "WHERE transaction_id = ? AND status = 'pending' "
+        "RETURNING user_id, chat_id, plan",
+        (status, now, transaction_id)
+    ).fetchone()
@@ -0,0 +1,125 @@
+import random
+from collections import namedtuple
+
+from seenset import load_seen
+
+# Per-user cursors over pseudo-random permutations of the catalog.
+#
+# The catalog is partitioned by file_type and a user has one cursor per type.
+# Each cursor walks a shuffled order of the partition positions [lo, hi) one
+# step at a time, so picking the next unseen item costs a handful of in-memory
+# lookups instead of sorting the whole catalog. Items added after the cursor
+# was created land above `hi` and are picked up as a new segment once the
+# current one is used up. The user's seen-set stays the source of truth for
+# repeats.
+Cursor = namedtuple('Cursor', ['file_type', 'seed', 'lo', 'hi', 'pos'])
+
+FEISTEL_ROUNDS = 4
+
+
+def _round_keys(seed):
+    keys = []
+    x = seed & 0xFFFFFFFFFFFFFFFF
+    for _ in range(FEISTEL_ROUNDS):
+        # splitmix64 step
+        x = (x + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        z = x
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        keys.append(z ^ (z >> 31))
+    return keys
+
+
+def permute(index, size, seed):
+    """Map index in [0, size) to a unique position in [0, size)."""
+    bits = max(2, (size - 1).bit_length())
+    if bits % 2:
+        bits += 1
+    half = bits // 2
+    mask = (1 << half) - 1
+    keys = _round_keys(seed)
+
+    x = index
+    while True:
+        left, right = x >> half, x & mask
+        for key in keys:
+            f = ((right ^ key) * 0x45D9F3B) & 0xFFFFFFFF
+            f ^= f >> 16
+            left, right = right, left ^ (f & mask)
+        x = (left << half) | right
+        # Cycle-walk until we land back inside the domain
+        if x < size:
+            return x
+
+
+def new_cursor(file_type, lo, hi):
+    return Cursor(file_type, random.getrandbits(63), lo, hi, 0)
+
+
+def load_cursor(cursor, user_id, file_type):
+    cursor.execute(
+        "SELECT seed, lo, hi, pos FROM user_cursors WHERE user_id = ? AND file_type = ?",
+        (user_id, file_type)
+    )
+    row = cursor.fetchone()
+    return Cursor(file_type, *row) if row else None
+
+
+def save_cursor(cursor, user_id, state):
+    cursor.execute(
+        "INSERT OR REPLACE INTO user_cursors (user_id, file_type, seed, lo, hi, pos) VALUES (?, ?, ?, ?, ?, ?)",
+        (user_id, state.file_type, state.seed, state.lo, state.hi, state.pos)
+    )
+
+
+def pick_video(cursor, user_id, catalog, file_types=None, states=None, exclude=()):
+    """Return (video_id, file_id, file_type, state) for the next unseen item, or None.
+
+    Only items whose type is in `file_types` are considered (every type when
+    None). The cursor is not persisted here; call save_cursor with the returned
+    state once the item was actually delivered so a failed send is retried.
+
+    `states` maps file types to cursors to continue from instead of the stored
+    ones, and ids in `exclude` are skipped as if seen; together they let
+    several picks be made ahead of delivery without repeating each other.
+    """
+    candidates = [t for t in (catalog.types() if file_types is None else file_types) if catalog.partition(t)]
+    seen = load_seen(cursor, user_id)
+    while candidates:
+        # Weight types by size so the mix follows the catalog
+        file_type = random.choices(candidates, [len(catalog.partition(t)) for t in candidates])[0]
+        picked = _pick_from(cursor, user_id, catalog, file_type, seen, states, exclude)
+        if picked is not None:
+            return picked
+        candidates.remove(file_type)
+    return None
+
+
+def _pick_from(cursor, user_id, catalog, file_type, seen, states=None, exclude=()):
+    ids = catalog.partition(file_type)
+    ahead = states is not None and file_type in states
+    state = states[file_type] if ahead else load_cursor(cursor, user_id, file_type)
+    if state is None:
+        state = new_cursor(file_type, 0, len(ids))
+
+    while True:
+        size = state.hi - state.lo
+        pos = state.pos
+        while pos < size:
+            video_id = ids[state.lo + permute(pos, size, state.seed)]
+            pos += 1
+            if video_id in seen or video_id in exclude:
+                continue
+            video = catalog.get(video_id)
+            if video is None:
+                continue
+            return video_id, video[0], file_type, state._replace(pos=pos)
+
+        # Current segment used up: move on to items added since it was created
+        if len(ids) <= state.hi:
+            # Remember that everything so far was seen so the next tap skips the
+            # scan, unless picks made ahead of this one are still undelivered
+            if not ahead:
+                save_cursor(cursor, user_id, state._replace(pos=size))
+            return None
+        state = new_cursor(file_type, state.hi, len(ids))
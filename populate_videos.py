@@ -1,16 +1,13 @@
 import sqlite3
 
-def add_video(file_id):
-    conn = sqlite3.connect('videos.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS videos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        file_id TEXT NOT NULL
-    )
-    ''')
+from migrations import DB_PATH, migrate
+
+def add_video(file_id, file_type="Video"):
+    conn = sqlite3.connect(DB_PATH)
+    migrate(conn)
 
-    cursor.execute("INSERT INTO videos (file_id) VALUES (?)", (file_id,))
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO videos (file_id, file_type) VALUES (?, ?)", (file_id, file_type))
     conn.commit()
     conn.close()
 
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from background import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+
+
+class _Pick:
+    __slots__ = ('video', 'fetched_at')
+
+    def __init__(self, video, fetched_at):
+        # (video_id, file_id, file_type, cursor) as returned by Database.pick_videos
+        self.video = video
+        self.fetched_at = fetched_at
+
+
+class _UserPicks:
+    __slots__ = ('picks', 'states', 'file_types', 'touched', 'lock')
+
+    def __init__(self, file_types, now):
+        self.picks = deque()
+        # Cursor after the newest pick handed out or queued, per file type;
+        # the next pick continues from here rather than from the stored cursor
+        self.states = {}
+        self.file_types = file_types
+        self.touched = now
+        self.lock = asyncio.Lock()
+
+
+# Picks each active user's next videos ahead of time.
+#
+# A tap takes the head of the user's queue, which is a dict lookup and a
+# popleft, and then asks the background task to top the queue back up to
+# `depth`. Picks are made in a chain: each continues from the previous one's
+# cursor and skips the ids still queued, so the queue never holds the same
+# item twice and a pick made on the spot (on a miss) never repeats one that
+# was handed out but not yet recorded. Nothing is written until delivery;
+# record_delivery saves the cursor that came with the pick, so queued picks
+# cost nothing if they are thrown away.
+#
+# A queue is thrown away when the user has been idle for `ttl` seconds, when
+# the user's allowed types change, and on release(), which get_video calls
+# after a failed send so the retry starts from the stored cursor again.
+# Queued picks quarantined in the meantime are skipped.
+class Prefetcher:
+    def __init__(self, db, depth=2, ttl=300, sweep_interval=30):
+        self.db = db
+        self.depth = depth
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.prefetched = 0
+        self._hit_age = 0.0
+        self._max_hit_age = 0.0
+        self._users = {}
+        self._wanted = set()
+        self._loop = BackgroundLoop()
+
+    def __len__(self):
+        return len(self._users)
+
+    def start(self):
+        self._loop.start(self._run)
+
+    async def stop(self):
+        await self._loop.stop()
+
+    async def take(self, user_id, file_types):
+        """Return the user's next (video_id, file_id, file_type, cursor), or None if nothing is left."""
+        file_types = tuple(file_types)
+        now = time.monotonic()
+        entry = self._users.get(user_id)
+        if entry is None or entry.file_types != file_types:
+            if entry is not None:
+                # The plan changed; picks for the old types are no use
+                self.stale += len(entry.picks)
+            entry = self._users[user_id] = _UserPicks(file_types, now)
+        entry.touched = now
+
+        video = self._pop(entry, now)
+        if video is None:
+            async with entry.lock:
+                # A refill may have finished while we waited for it
+                video = self._pop(entry, now)
+                if video is None:
+                    self.misses += 1
+                    picks = await self.db.pick_videos(user_id, file_types, 1, entry.states,
+                                                      [pick.video[0] for pick in entry.picks])
+                    if picks:
+                        video = picks[0]
+                        entry.states[video[2]] = video[3]
+
+        self._wanted.add(user_id)
+        self._loop.wake()
+        return video
+
+    def _pop(self, entry, now):
+        while entry.picks:
+            pick = entry.picks.popleft()
+            if self.db.catalog.get(pick.video[0]) is None:
+                # Quarantined since it was picked; the rest of the chain still holds
+                self.stale += 1
+                continue
+            age = now - pick.fetched_at
+            self.hits += 1
+            self._hit_age += age
+            self._max_hit_age = max(self._max_hit_age, age)
+            return pick.video
+        return None
+
+    def release(self, user_id):
+        """Forget the user's queued picks and cursors, e.g. after a failed send."""
+        self._users.pop(user_id, None)
+        self._wanted.discard(user_id)
+
+    async def _run(self):
+        last_sweep = time.monotonic()
+        while await self._loop.sleep(self.sweep_interval):
+            wanted, self._wanted = self._wanted, set()
+            for user_id in wanted:
+                try:
+                    await self._refill(user_id)
+                except Exception as e:
+                    logger.error(f"Failed to prefetch for user {user_id}: {e}")
+
+            now = time.monotonic()
+            if now - last_sweep >= self.sweep_interval:
+                self._sweep(now)
+                last_sweep = now
+
+    async def _refill(self, user_id):
+        entry = self._users.get(user_id)
+        if entry is None:
+            return
+        async with entry.lock:
+            need = self.depth - len(entry.picks)
+            if need <= 0 or self._users.get(user_id) is not entry:
+                return
+            picks = await self.db.pick_videos(user_id, entry.file_types, need, entry.states,
+                                              [pick.video[0] for pick in entry.picks])
+            if self._users.get(user_id) is not entry:
+                # Released while we were picking
+                return
+            now = time.monotonic()
+            for video in picks:
+                entry.picks.append(_Pick(video, now))
+                entry.states[video[2]] = video[3]
+            self.prefetched += len(picks)
+
+    def _sweep(self, now):
+        cutoff = now - self.ttl
+        idle = [user_id for user_id, entry in self._users.items() if entry.touched < cutoff and not entry.lock.locked()]
+        for user_id in idle:
+            self.expired += len(self._users.pop(user_id).picks)
+        if idle:
+            logger.debug(f"Released prefetched picks of {len(idle)} idle users.")
+
+    def stats(self):
+        taken = self.hits + self.misses
+        return {
+            'users': len(self._users),
+            'queued': sum(len(entry.picks) for entry in self._users.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / taken, 3) if taken else 0.0,
+            'stale': self.stale,
+            'expired': self.expired,
+            'prefetched': self.prefetched,
+            'avg_hit_age': round(self._hit_age / self.hits, 2) if self.hits else 0.0,
+            'max_hit_age': round(self._max_hit_age, 2),
+        }
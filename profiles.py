@@ -0,0 +1,80 @@
+import sys
+from collections import OrderedDict
+
+# Bounded LRU cache of active users' profiles.
+#
+# Database keeps it in front of the users and user_quota tables and writes
+# through on every change, so a repeat tap from an active user is answered
+# from memory. It is only touched from the event loop thread.
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+class Profile:
+    __slots__ = ('plan', 'last_access', 'plan_expires_at', 'day', 'used')
+
+    def __init__(self, plan, last_access, plan_expires_at, day=None, used=None):
+        self.plan = plan
+        self.last_access = last_access
+        self.plan_expires_at = plan_expires_at
+        # Quota usage for `day`; None until the bucket has been read
+        self.day = day
+        self.used = used
+
+    def as_row(self):
+        return self.plan, self.last_access, self.plan_expires_at
+
+
+def _entry_size():
+    # Profile record plus its key and its OrderedDict link
+    return sys.getsizeof(Profile(None, 0, 0)) + sys.getsizeof(2 ** 40) + 100
+
+
+class ProfileCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.capacity = max(1, max_bytes // _entry_size())
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id):
+        profile = self._entries.get(user_id)
+        if profile is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return profile
+
+    def peek(self, user_id):
+        """Like get(), but without touching LRU order or the counters."""
+        return self._entries.get(user_id)
+
+    def put(self, user_id, profile):
+        self._entries[user_id] = profile
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id):
+        self._entries.pop(user_id, None)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hit_rate, 4),
+        }
@@ -0,0 +1,133 @@
+import logging
+import time
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+logger = logging.getLogger(__name__)
+
+# How a failed send is classified
+BAD_FILE = 'bad_file'
+TRANSIENT = 'transient'
+OTHER = 'other'
+
+SUSPECT = 'suspect'
+DEAD = 'dead'
+
+# Fragments of BadRequest messages that blame the file_id itself
+BAD_FILE_MESSAGES = (
+    'wrong file identifier',
+    'wrong remote file identifier',
+    'invalid file_id',
+    'file_id_invalid',
+    'wrong type of the web page content',
+    'failed to get http url content',
+    'file reference expired',
+    'media_empty',
+)
+
+# get_file refuses files over 20 MB, which still proves the file_id is valid
+FILE_TOO_BIG = 'file is too big'
+
+PROBE_INTERVAL = 600
+MAX_PROBES = 3
+
+
+# Dead file_id handling.
+#
+# A send that Telegram rejects because of the file_id moves the row into
+# video_quarantine and out of the in-memory catalog, so nobody is offered it
+# again. Rows that keep failing with transient errors are quarantined as
+# suspects too. A periodic job probes quarantined file_ids with get_file at low
+# priority: a valid one goes back into the catalog, one that fails MAX_PROBES
+# probes is marked dead and left alone.
+def classify(error):
+    if isinstance(error, BadRequest):
+        message = error.message.lower()
+        if any(fragment in message for fragment in BAD_FILE_MESSAGES):
+            return BAD_FILE
+        return OTHER
+    if isinstance(error, (TimedOut, NetworkError, RetryAfter)):
+        return TRANSIENT
+    # Forbidden (user blocked the bot) and friends say nothing about the file
+    return OTHER
+
+
+class SuspectTracker:
+    """Counts consecutive transient send failures per video id."""
+
+    def __init__(self, threshold=3, max_entries=10000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._failures = {}
+
+    def failed(self, video_id):
+        """Record a transient failure; returns True once the video should be quarantined."""
+        count = self._failures.get(video_id, 0) + 1
+        if count >= self.threshold:
+            self._failures.pop(video_id, None)
+            return True
+        if video_id not in self._failures and len(self._failures) >= self.max_entries:
+            # Forget the oldest entry; a real suspect will fail again soon enough
+            del self._failures[next(iter(self._failures))]
+        self._failures[video_id] = count
+        return False
+
+    def succeeded(self, video_id):
+        self._failures.pop(video_id, None)
+
+
+async def revalidate(db, probe, limit=20):
+    """Probe quarantined file_ids that are due; returns (restored, dead).
+
+    probe(file_id) returns True for a valid file_id and False for a bad one,
+    and raises on transient errors, which do not count as a failed probe.
+    """
+    restored = dead = 0
+    for video_id, file_id, probes in await db.due_probes(int(time.time()), limit):
+        try:
+            valid = await probe(file_id)
+        except Exception as e:
+            logger.warning(f"Probe of video {video_id} failed: {e}")
+            await db.reschedule_probe(video_id, probes, int(time.time()) + PROBE_INTERVAL)
+            continue
+
+        if valid:
+            await db.restore_video(video_id)
+            restored += 1
+            continue
+
+        probes += 1
+        if probes >= MAX_PROBES:
+            dead += 1
+        await db.reschedule_probe(video_id, probes, int(time.time()) + PROBE_INTERVAL * 2 ** probes,
+                                  DEAD if probes >= MAX_PROBES else SUSPECT)
+    return restored, dead
+
+
+def quarantine(conn, video_id, reason, now):
+    conn.execute(
+        "INSERT OR IGNORE INTO video_quarantine (video_id, reason, status, probes, quarantined_at, next_probe_at) "
+        "VALUES (?, ?, ?, 0, ?, ?)",
+        (video_id, reason[:200], SUSPECT, now, now + PROBE_INTERVAL)
+    )
+
+
+def due_probes(conn, now, limit):
+    """Return [(video_id, file_id, probes)] for suspects due for a probe."""
+    return conn.execute(
+        "SELECT q.video_id, v.file_id, q.probes FROM video_quarantine q JOIN videos v ON v.id = q.video_id "
+        "WHERE q.status = 'suspect' AND q.next_probe_at <= ? ORDER BY q.next_probe_at LIMIT ?",
+        (now, limit)
+    ).fetchall()
+
+
+def reschedule_probe(conn, video_id, probes, next_probe_at, status):
+    conn.execute(
+        "UPDATE video_quarantine SET probes = ?, next_probe_at = ?, status = ? WHERE video_id = ?",
+        (probes, next_probe_at, status, video_id)
+    )
+
+
+def release(conn, video_id):
+    """Drop a video from quarantine; returns False if it was not quarantined."""
+    return conn.execute("DELETE FROM video_quarantine WHERE video_id = ?", (video_id,)).rowcount > 0
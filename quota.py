@@ -0,0 +1,74 @@
+import time
+
+# Daily quota accounting keyed by (user, UTC day).
+#
+# Every delivery bumps the counter row for the current day bucket. A new day
+# simply starts a new row, so there is no reset write; old buckets are pruned
+# in bulk. Limits come from the plans table rather than being hard-coded.
+SECONDS_PER_DAY = 24 * 60 * 60
+
+DEFAULT_PLAN = 'free'
+
+
+def current_day(now=None):
+    return int(time.time() if now is None else now) // SECONDS_PER_DAY
+
+
+def load_plans(conn):
+    """Return {plan name: (daily_limit, duration_days)} from the plans table."""
+    return {
+        name: (daily_limit, duration_days)
+        for name, daily_limit, duration_days in conn.execute(
+            "SELECT name, daily_limit, duration_days FROM plans"
+        )
+    }
+
+
+def load_allowed_types(conn):
+    """Return {plan name: frozenset of file types, or None for every type}."""
+    return {
+        name: frozenset(t.strip() for t in allowed.split(',') if t.strip()) if allowed else None
+        for name, allowed in conn.execute("SELECT name, allowed_types FROM plans")
+    }
+
+
+def try_consume(conn, user_id, daily_limit, day):
+    """Atomically take one unit of today's quota.
+
+    Returns the new usage count, or None when the user is already at
+    daily_limit. Check and increment are a single UPSERT, so two concurrent
+    requests can never both slip past the limit.
+    """
+    if daily_limit <= 0:
+        return None
+    row = conn.execute('''
+        INSERT INTO user_quota (user_id, day, used) VALUES (?, ?, 1)
+        ON CONFLICT (user_id, day) DO UPDATE SET used = used + 1 WHERE used < ?
+        RETURNING used
+    ''', (user_id, day, daily_limit)).fetchone()
+    return row[0] if row else None
+
+
+def refund(conn, user_id, day):
+    """Give back a unit taken by try_consume when the delivery did not happen."""
+    conn.execute(
+        "UPDATE user_quota SET used = used - 1 WHERE user_id = ? AND day = ? AND used > 0",
+        (user_id, day)
+    )
+
+
+def used_today(conn, user_id, day):
+    row = conn.execute(
+        "SELECT used FROM user_quota WHERE user_id = ? AND day = ?", (user_id, day)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def reset_day(conn, user_id, day):
+    conn.execute("DELETE FROM user_quota WHERE user_id = ? AND day = ?", (user_id, day))
+
+
+def prune(conn, day, keep_days=2):
+    """Drop day buckets older than keep_days; returns the number of rows removed."""
+    cursor = conn.execute("DELETE FROM user_quota WHERE day < ?", (day - keep_days,))
+    return cursor.rowcount
@@ -0,0 +1,53 @@
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now=None, tokens=1):
+        """Seconds until `tokens` are available; 0 means they are available now."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def take(self, now=None, tokens=1):
+        """Consume `tokens` if available and return True, otherwise return False."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def reserve(self, now=None, tokens=1):
+        """Consume `tokens` even if that leaves the bucket in debt; returns seconds until they are covered.
+
+        Later callers see the debt in delay(), so waiters line up behind each
+        other instead of racing for the same refill.
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= tokens
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def full(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        return self.tokens >= self.capacity
@@ -0,0 +1,53 @@
+import argparse
+import json
+import os
+import sys
+
+import httpx
+
+from webhook import SECRET_HEADER
+
+
+# Replays recorded Telegram updates against a locally running webhook server.
+#
+# Input is a file (or stdin) holding one update per line, or a single JSON
+# update / JSON array of updates. Each one is POSTed the way Telegram would,
+# with the secret token header set from --secret or WEBHOOK_SECRET.
+def read_updates(stream):
+    text = stream.read().strip()
+    if not text:
+        return []
+    if text[0] == '[':
+        return json.loads(text)
+    try:
+        return [json.loads(text)]
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="POST recorded updates to a local webhook server.")
+    parser.add_argument('file', nargs='?', help="JSON/JSONL file with updates (default: stdin)")
+    parser.add_argument('--url', default=f"http://127.0.0.1:{os.getenv('WEBHOOK_PORT', '8443')}{os.getenv('WEBHOOK_PATH', '/telegram')}")
+    parser.add_argument('--secret', default=os.getenv('WEBHOOK_SECRET', ''))
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            updates = read_updates(f)
+    else:
+        updates = read_updates(sys.stdin)
+
+    failed = 0
+    with httpx.Client(headers={SECRET_HEADER: args.secret}) as client:
+        for update in updates:
+            response = client.post(args.url, json=update)
+            if response.status_code != 200:
+                failed += 1
+                print(f"Update {update.get('update_id')}: HTTP {response.status_code}")
+    print(f"Replayed {len(updates)} updates, {failed} failed.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+# Compact per-user set of delivered video ids.
+#
+# Ids are split into 65536-wide chunks. A chunk holding few ids is a sorted
+# array of 16-bit offsets (2 bytes per id); once it passes ARRAY_MAX entries it
+# becomes a fixed 8 KiB bitmap. A user who has seen 200 videos costs ~400
+# bytes instead of 200 user_videos rows plus their index entries.
+ARRAY_MAX = 4096
+BITMAP_BYTES = 1 << 13
+
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<BI')
+_CHUNK = struct.Struct('<IBI')
+
+
+class SeenSet:
+    __slots__ = ('_chunks', '_size')
+
+    def __init__(self):
+        self._chunks = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, video_id):
+        chunk = self._chunks.get(video_id >> 16)
+        if chunk is None:
+            return False
+        low = video_id & 0xFFFF
+        if isinstance(chunk, bytearray):
+            return bool(chunk[low >> 3] & (1 << (low & 7)))
+        i = bisect_left(chunk, low)
+        return i < len(chunk) and chunk[i] == low
+
+    def __iter__(self):
+        for key in sorted(self._chunks):
+            chunk = self._chunks[key]
+            base = key << 16
+            if isinstance(chunk, bytearray):
+                for byte_index, byte in enumerate(chunk):
+                    if byte:
+                        for bit in range(8):
+                            if byte & (1 << bit):
+                                yield base | (byte_index << 3) | bit
+            else:
+                for low in chunk:
+                    yield base | low
+
+    def add(self, video_id):
+        """Add video_id, returning False if it was already present."""
+        key, low = video_id >> 16, video_id & 0xFFFF
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            self._chunks[key] = array('H', [low])
+            self._size += 1
+            return True
+
+        if isinstance(chunk, bytearray):
+            mask = 1 << (low & 7)
+            if chunk[low >> 3] & mask:
+                return False
+            chunk[low >> 3] |= mask
+            self._size += 1
+            return True
+
+        i = bisect_left(chunk, low)
+        if i < len(chunk) and chunk[i] == low:
+            return False
+        chunk.insert(i, low)
+        self._size += 1
+        if len(chunk) > ARRAY_MAX:
+            self._chunks[key] = _to_bitmap(chunk)
+        return True
+
+    def to_bytes(self):
+        parts = [_HEADER.pack(FORMAT_VERSION, len(self._chunks))]
+        for key in sorted(self._chunks):
+            chunk = self._chunks[key]
+            if isinstance(chunk, bytearray):
+                parts.append(_CHUNK.pack(key, 1, 0))
+                parts.append(bytes(chunk))
+            else:
+                parts.append(_CHUNK.pack(key, 0, len(chunk)))
+                parts.append(_le_bytes(chunk))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        seen = cls()
+        version, count = _HEADER.unpack_from(data, 0)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported seen-set format version {version}")
+
+        offset = _HEADER.size
+        for _ in range(count):
+            key, kind, length = _CHUNK.unpack_from(data, offset)
+            offset += _CHUNK.size
+            if kind == 1:
+                chunk = bytearray(data[offset:offset + BITMAP_BYTES])
+                offset += BITMAP_BYTES
+                seen._size += sum(bin(byte).count('1') for byte in chunk)
+            else:
+                chunk = array('H')
+                chunk.frombytes(data[offset:offset + 2 * length])
+                if sys.byteorder == 'big':
+                    chunk.byteswap()
+                offset += 2 * length
+                seen._size += length
+            seen._chunks[key] = chunk
+        return seen
+
+
+def _to_bitmap(chunk):
+    bitmap = bytearray(BITMAP_BYTES)
+    for low in chunk:
+        bitmap[low >> 3] |= 1 << (low & 7)
+    return bitmap
+
+
+def _le_bytes(chunk):
+    if sys.byteorder == 'little':
+        return chunk.tobytes()
+    swapped = array('H', chunk)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def load_seen(cursor, user_id):
+    cursor.execute("SELECT seen FROM user_seen WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    return SeenSet.from_bytes(row[0]) if row else SeenSet()
+
+
+def save_seen(cursor, user_id, seen):
+    cursor.execute(
+        "INSERT OR REPLACE INTO user_seen (user_id, seen) VALUES (?, ?)",
+        (user_id, seen.to_bytes())
+    )
+
+
+def mark_seen(cursor, user_id, video_id):
+    seen = load_seen(cursor, user_id)
+    if seen.add(video_id):
+        save_seen(cursor, user_id, seen)
+
+
+def migrate_user_videos(cursor):
+    """Fold legacy user_videos rows into user_seen and drop the old table."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'user_videos'")
+    if cursor.fetchone() is None:
+        return 0
+
+    cursor.execute("SELECT user_id, video_id FROM user_videos ORDER BY user_id")
+    rows = cursor.fetchall()
+    pending = {}
+    for user_id, video_id in rows:
+        seen = pending.get(user_id)
+        if seen is None:
+            seen = pending[user_id] = load_seen(cursor, user_id)
+        seen.add(video_id)
+
+    for user_id, seen in pending.items():
+        save_seen(cursor, user_id, seen)
+    cursor.execute("DROP TABLE user_videos")
+    return len(rows)
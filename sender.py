@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from telegram.error import RetryAfter
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Priority classes; lower numbers are sent first
+USER = 0
+BACKGROUND = 1
+LOW = 2
+
+PRIORITY_NAMES = {USER: 'user', BACKGROUND: 'background', LOW: 'low'}
+
+# Telegram allows about 30 messages per second overall and 1 per second per chat
+GLOBAL_RATE = 30
+PER_CHAT_RATE = 1
+
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'method', 'kwargs', 'future', 'enqueued', 'attempts')
+
+    def __init__(self, priority, seq, method, kwargs, future):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+# Central outbound send scheduler.
+#
+# Every Bot API send goes through send(), which queues the call by priority
+# and dispatches it once both the global token bucket and the target chat's
+# bucket have a token. A chat that is still rate limited has its job parked
+# and re-queued later instead of holding up other chats. RetryAfter from
+# Telegram pauses all dispatching for the requested time and the job is retried
+# automatically. Sends themselves run as tasks, so a slow upload never blocks
+# the dispatcher.
+class SendScheduler:
+    def __init__(self, global_rate=GLOBAL_RATE, per_chat_rate=PER_CHAT_RATE, per_chat_burst=3,
+                 max_retries=3, max_in_flight=64, max_chat_buckets=10000):
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._queue = None
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._seq = itertools.count()
+        self._task = None
+        self._paused_until = 0.0
+        self._deferred = 0
+        self._in_flight = 0
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self._waits = {priority: [0, 0.0, 0.0] for priority in PRIORITY_NAMES}
+        self.sent = 0
+        self.failed = 0
+        self.retry_afters = 0
+
+    def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=5.0):
+        if self._task is None:
+            return
+        # Give queued sends a moment to drain before shutting down
+        deadline = time.monotonic() + timeout
+        while self.depth and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def submit(self, method, priority=USER, **kwargs):
+        """Queue a send and return a future for its result."""
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(priority, next(self._seq), method, kwargs, future)
+        self._depth[priority] += 1
+        self._queue.put_nowait(job)
+        return future
+
+    async def send(self, method, priority=USER, **kwargs):
+        """Queue a Bot API send such as bot.send_video and wait for its result."""
+        return await self.submit(method, priority, **kwargs)
+
+    @property
+    def depth(self):
+        return sum(self._depth.values()) + self._in_flight
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chat_buckets:
+                # Forget chats whose bucket has refilled; they behave as new
+                now = time.monotonic()
+                for key in [key for key, b in self._chats.items() if b.full(now)]:
+                    del self._chats[key]
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    def _defer(self, job, delay):
+        self._deferred += 1
+        asyncio.get_running_loop().call_later(delay, self._requeue, job)
+
+    def _requeue(self, job):
+        self._deferred -= 1
+        self._queue.put_nowait(job)
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            if job.future.done():
+                # The caller gave up waiting
+                self._depth[job.priority] -= 1
+                continue
+
+            now = time.monotonic()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                now = time.monotonic()
+
+            chat_bucket = self._chat_bucket(job.kwargs.get('chat_id'))
+            delay = chat_bucket.delay(now)
+            if delay > 0:
+                self._defer(job, delay)
+                continue
+
+            delay = self._global.delay(now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                now = time.monotonic()
+            self._global.take(now)
+            chat_bucket.take(now)
+
+            self._depth[job.priority] -= 1
+            waits = self._waits[job.priority]
+            wait = now - job.enqueued
+            waits[0] += 1
+            waits[1] += wait
+            waits[2] = max(waits[2], wait)
+
+            await self._slots.acquire()
+            self._in_flight += 1
+            asyncio.create_task(self._execute(job))
+
+    async def _execute(self, job):
+        try:
+            job.attempts += 1
+            result = await job.method(**job.kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+            self.retry_afters += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            logger.warning(f"Flood control hit; pausing sends for {seconds:.0f}s.")
+            if job.attempts <= self.max_retries and not job.future.done():
+                self._depth[job.priority] += 1
+                self._defer(job, seconds)
+            elif not job.future.done():
+                self.failed += 1
+                job.future.set_exception(e)
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        waits = {}
+        for priority, (count, total, worst) in self._waits.items():
+            waits[PRIORITY_NAMES[priority]] = {
+                'count': count,
+                'avg_wait': round(total / count, 4) if count else 0.0,
+                'max_wait': round(worst, 4),
+            }
+        return {
+            'queued': {PRIORITY_NAMES[p]: depth for p, depth in self._depth.items()},
+            'deferred': self._deferred,
+            'in_flight': self._in_flight,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retry_afters': self.retry_afters,
+            'wait': waits,
+        }
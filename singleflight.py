@@ -0,0 +1,57 @@
+import asyncio
+
+
+class _Flight:
+    __slots__ = ('lock', 'callers')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Calls running or waiting on this key
+        self.callers = 0
+
+
+# Per-key single-flight with a short queue.
+#
+# Calls sharing a key run one at a time, in arrival order. While one is in
+# flight at most `max_queued` more may wait behind it; anything beyond that
+# collapses into the calls already there and returns straight away without
+# running. Keys with nothing running or waiting take no memory.
+#
+# With one key per user this serializes each user's requests, so a check
+# followed by an update can never interleave with the same user's next tap,
+# while different users still run concurrently.
+class SingleFlight:
+    def __init__(self, max_queued=1):
+        self.max_queued = max_queued
+        self.ran = 0
+        self.collapsed = 0
+        self._flights = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    def busy(self, key):
+        return key in self._flights
+
+    async def run(self, key, fn, *args):
+        """Run fn(*args) under key; returns False if the call collapsed instead."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+        elif flight.callers > self.max_queued:
+            self.collapsed += 1
+            return False
+
+        flight.callers += 1
+        try:
+            async with flight.lock:
+                self.ran += 1
+                await fn(*args)
+        finally:
+            flight.callers -= 1
+            if not flight.callers:
+                del self._flights[key]
+        return True
+
+    def stats(self):
+        return {'keys': len(self._flights), 'ran': self.ran, 'collapsed': self.collapsed}
@@ -1,9 +1,15 @@
 import logging
+import os
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext
 from telegram.ext import Updater, CallbackContext
 from telegram.error import TelegramError
 
+from chat_settings import DB_PATH as SETTINGS_DB_PATH, ChatSettingsStore
+from membership import MembershipCache
+import vulgarity
+from vulgarity import WordFilter
+
 # Enable logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -12,17 +18,81 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Global variables
-block_level = 0
-mess_deleted = False
 bad_words = ["bad word", "badword"]
 very_bad_words = ["very bad word", "verybadword"]
+# Word list file with [mild]/[severe] sections; reloaded whenever it changes
+word_filter = WordFilter(
+    os.getenv('VULGARITY_WORDS', 'bad_words.txt'),
+    defaults=[(word, vulgarity.MILD) for word in bad_words] + [(word, vulgarity.SEVERE) for word in very_bad_words]
+)
+# Lowest severity removed at each block level: medium blocks only very bad words
+block_thresholds = [None, vulgarity.SEVERE, vulgarity.MILD]
+block_states = ["Block disabled", "Medium block", "Hard block"]
+# Block level and extra words per chat, kept across restarts
+chat_settings = ChatSettingsStore(os.getenv('CHAT_SETTINGS_DB', SETTINGS_DB_PATH))
+required_channels = ["@zetalvx", "@tutorialbotprogramming"]
+membership = MembershipCache()
 
 async def start(update: Update, context: CallbackContext):
     user = update.effective_user
     await update.message.reply_text(f"Hello! I'm your Bot, {user.first_name}!")
 
+async def can_moderate(update: Update, context: CallbackContext):
+    # Only group admins may change a group's filter; in a private chat the user is the admin
+    chat = update.effective_chat
+    if chat.type == 'private':
+        return True
+    try:
+        member = await context.bot.get_chat_member(chat.id, update.effective_user.id)
+    except TelegramError as e:
+        logger.error(f"Failed to check admin status in chat {chat.id}: {e}")
+        return False
+    if member.status in ('administrator', 'creator'):
+        return True
+    await update.message.reply_text("Only group admins can change the vulgarity filter.")
+    return False
+
+async def vulgarity_command(update: Update, context: CallbackContext):
+    # Cycle this chat's block level
+    if not await can_moderate(update, context):
+        return
+    chat_id = update.effective_chat.id
+    settings = await chat_settings.get(chat_id)
+    block_level = (settings.block_level + 1) % 3
+    await chat_settings.set_block_level(chat_id, block_level)
+    await update.message.reply_text(f"Vulgarity: \"{block_states[block_level]}\".")
+
+async def word_command(update: Update, context: CallbackContext):
+    # /badword and /verybadword add a term to this chat's own list, /allowword removes it
+    term = ' '.join(context.args).lower()
+    if not vulgarity.normalize(term):
+        await update.message.reply_text("Usage: /badword <word>, /verybadword <word> or /allowword <word>")
+        return
+    if not await can_moderate(update, context):
+        return
+
+    chat_id = update.effective_chat.id
+    command = update.message.text.split()[0][1:].split('@')[0].lower()
+    if command == "allowword":
+        if await chat_settings.remove_word(chat_id, term):
+            await update.message.reply_text(f"\"{term}\" is no longer filtered here.")
+        else:
+            await update.message.reply_text(f"\"{term}\" is not on this chat's list.")
+        return
+
+    severity = vulgarity.SEVERE if command == "verybadword" else vulgarity.MILD
+    await chat_settings.add_word(chat_id, term, severity)
+    await update.message.reply_text(f"\"{term}\" is now filtered here.")
+
+def message_severity(settings, text):
+    # Normalize once for both the global list and the chat's own words
+    text = vulgarity.normalize(text)
+    severity = word_filter.severity(text, normalized=True)
+    if severity < vulgarity.SEVERE and settings.matcher is not None:
+        severity = max(severity, settings.matcher.severity(text, normalized=True))
+    return severity
+
 async def handle_message(update: Update, context: CallbackContext):
-    global block_level, mess_deleted
     chat_id = update.effective_chat.id
     message_text = update.message.text.lower()
     user = update.message.from_user
@@ -36,11 +106,8 @@ async def handle_message(update: Update, context: CallbackContext):
     # Display message info
     logger.info(f"Received a '{message_text}' message in chat {chat_id} from {first_name} {last_name} at {hour}:{minute}:{second} on {year}/{month}/{day}")
 
-    # Check if the user is a member of the group/channel
-    chat_member = await context.bot.get_chat_member(chat_id="@zetalvx", user_id=user.id)
-    chat_member2 = await context.bot.get_chat_member(chat_id="@tutorialbotprogramming", user_id=user.id)
-
-    if chat_member.status in ['left', 'kicked'] or chat_member2.status in ['left', 'kicked']:
+    # Check if the user is a member of the groups/channels, all at once
+    if await membership.missing(context.bot, required_channels, user.id):
         # Ask the user to join the channel
         keyboard = [[
             InlineKeyboardButton("Channel 1", url="https://t.me/zetalvx"),
@@ -50,31 +117,15 @@ async def handle_message(update: Update, context: CallbackContext):
         await update.message.reply_text("Before using the bot, please follow these channels. Click /home to continue.", reply_markup=reply_markup)
         return
 
-    # Handle vulgarity filter
-    if message_text == "/vulgarity":
-        block_level = (block_level + 1) % 3
-        block_states = ["Block disabled", "Medium block", "Hard block"]
-        await update.message.reply_text(f"Vulgarity: \"{block_states[block_level]}\".")
+    # Check bad and very bad words in a single pass, at this chat's block level
+    settings = await chat_settings.get(chat_id)
+    threshold = block_thresholds[settings.block_level]
+    if threshold is not None and message_severity(settings, message_text) >= threshold:
+        settings.mess_deleted = True
+        await context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
+        await update.message.reply_text(f"{first_name} {last_name}, you can't say that!")
         return
 
-    # Check bad words
-    if block_level >= 2:
-        for bad_word in bad_words:
-            if bad_word in message_text:
-                mess_deleted = True
-                await context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
-                await update.message.reply_text(f"{first_name} {last_name}, you can't say that!")
-                return
-
-    # Check very bad words
-    if block_level >= 1:
-        for very_bad_word in very_bad_words:
-            if very_bad_word in message_text:
-                mess_deleted = True
-                await context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
-                await update.message.reply_text(f"{first_name} {last_name}, you can't say that!")
-                return
-
     # Specific commands or messages
     if message_text == "hello":
         await update.message.reply_text(f"Hello {first_name} {last_name}!")
@@ -120,10 +171,20 @@ async def handle_message(update: Update, context: CallbackContext):
 async def error_handler(update: Update, context: CallbackContext):
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
 
+async def on_startup(application):
+    await chat_settings.start()
+    word_filter.start()
+
+async def on_shutdown(application):
+    await word_filter.stop()
+    await chat_settings.stop()
+
 def main():
-    application = Application.builder().token("ADD YOUR TELEGRAM BOT TOKEN").build()
+    application = Application.builder().token("ADD YOUR TELEGRAM BOT TOKEN").post_init(on_startup).post_shutdown(on_shutdown).build()
 
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("vulgarity", vulgarity_command))
+    application.add_handler(CommandHandler(["badword", "verybadword", "allowword"], word_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
     application.add_error_handler(error_handler)
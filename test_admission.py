@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+import admission
+from admission import SHED_GLOBAL, SHED_USER, AdmissionControl
+
+
+def _clock(monkeypatch, start=1000.0):
+    now = [start]
+    monkeypatch.setattr(admission, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_user_flood_is_shed(monkeypatch):
+    async def test():
+        now = _clock(monkeypatch)
+        control = AdmissionControl(user_rate=1.0, user_burst=3)
+        assert [await control.admit(1) for _ in range(5)] == [None, None, None, SHED_USER, SHED_USER]
+        # Other users are unaffected
+        assert await control.admit(2) is None
+        # The bucket refills at user_rate
+        now[0] += 1
+        assert await control.admit(1) is None
+        assert await control.admit(1) == SHED_USER
+        assert control.stats()['shed'] == {SHED_USER: 3, SHED_GLOBAL: 0}
+        assert control.shed_since_report() == 3
+        assert control.shed_since_report() == 0
+
+    asyncio.run(test())
+
+
+def test_global_overload_is_shed_past_max_delay(monkeypatch):
+    async def test():
+        _clock(monkeypatch)
+        control = AdmissionControl(global_rate=1.0, global_burst=1, max_delay=0.5)
+        assert await control.admit(1) is None
+        assert await control.admit(2) == SHED_GLOBAL
+        assert control.admitted == 1
+
+    asyncio.run(test())
+
+
+def test_global_overload_waits_within_max_delay():
+    async def test():
+        control = AdmissionControl(global_rate=100.0, global_burst=1, max_delay=1.0)
+        assert await asyncio.gather(*(control.admit(user_id) for user_id in range(3))) == [None] * 3
+        assert control.delayed == 2
+        assert control.admitted == 3
+
+    asyncio.run(test())
+
+
+def test_full_buckets_forgotten_at_max_users(monkeypatch):
+    async def test():
+        now = _clock(monkeypatch)
+        control = AdmissionControl(user_rate=1.0, user_burst=2, max_users=2)
+        await control.admit(1)
+        await control.admit(2)
+        now[0] += 10
+        await control.admit(3)
+        assert control.stats()['users'] == 1
+
+    asyncio.run(test())
@@ -0,0 +1,44 @@
+import io
+import json
+
+import pytest
+
+from backfill import iter_export_messages, media_from_export
+
+
+def _export(messages, padding=''):
+    return json.dumps({'name': 'channel', 'type': 'public_channel', 'padding': padding, 'messages': messages},
+                      indent=1)
+
+
+MESSAGES = [
+    {'id': 1, 'video': {'file_id': 'v1', 'file_unique_id': 'u1'}, 'text': 'a "quoted" ] bracket'},
+    {'id': 2, 'photo': [{'file_id': 'small', 'file_unique_id': 's'}, {'file_id': 'big', 'file_unique_id': 'b'}]},
+    {'id': 3, 'text': 'no media, {"messages": []}'},
+    {'id': 4, 'sticker': {'file_id': 'st', 'file_unique_id': 'su'}},
+]
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 7, 16, 64, 1 << 20])
+def test_messages_split_across_reads(read_size):
+    # Small reads put every boundary, including the "messages" key, across two chunks
+    text = _export(MESSAGES, padding='x' * 40)
+    assert list(iter_export_messages(io.StringIO(text), read_size)) == MESSAGES
+
+
+def test_empty_and_missing_messages():
+    assert list(iter_export_messages(io.StringIO(_export([])), 4)) == []
+    with pytest.raises(ValueError):
+        list(iter_export_messages(io.StringIO('{"name": "channel"}'), 4))
+
+
+def test_truncated_export():
+    text = _export(MESSAGES)
+    with pytest.raises(ValueError):
+        list(iter_export_messages(io.StringIO(text[:len(text) // 2]), 8))
+
+
+def test_media_from_export():
+    assert [media_from_export(message) for message in MESSAGES] == [
+        ('v1', 'u1', 'Video'), ('big', 'b', 'Photo'), None, ('st', 'su', 'Sticker'),
+    ]
@@ -0,0 +1,82 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from ingest import IngestQueue
+
+
+class FakeDb:
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    async def insert_videos(self, rows):
+        if self.fail:
+            raise sqlite3.OperationalError('database is locked')
+        self.batches.append(list(rows))
+        return len(rows)
+
+
+def _post(n, group_id=None):
+    video = SimpleNamespace(file_id=f'file{n}', file_unique_id=f'unique{n}')
+    return SimpleNamespace(video=video, photo=None, document=None, audio=None, voice=None, sticker=None,
+                           media_group_id=group_id)
+
+
+def test_album_is_held_and_written_whole():
+    async def test():
+        db = FakeDb()
+        queue = IngestQueue(db, batch_size=3, album_wait=3600)
+        queue.add(_post(1))
+        for n in (2, 3, 4):
+            queue.add(_post(n, group_id='album'))
+        queue.add(_post(5))
+        assert len(queue) == 5
+
+        # The album is still filling up
+        await queue.flush()
+        assert db.batches == [[('file1', 'unique1', 'Video'), ('file5', 'unique5', 'Video')]]
+        assert len(queue) == 3
+
+        await queue.flush(force=True)
+        assert db.batches[1] == [(f'file{n}', f'unique{n}', 'Video') for n in (2, 3, 4)]
+        assert len(queue) == 0
+        assert queue.added == 5
+
+    asyncio.run(test())
+
+
+def test_album_never_split_across_batches():
+    async def test():
+        db = FakeDb()
+        queue = IngestQueue(db, batch_size=3)
+        queue.add(_post(1))
+        queue.add(_post(2))
+        for n in (3, 4):
+            queue.add(_post(n, group_id='album'))
+        await queue.flush(force=True)
+        assert [len(batch) for batch in db.batches] == [2, 2]
+
+    asyncio.run(test())
+
+
+def test_failed_write_keeps_the_posts():
+    async def test():
+        db = FakeDb()
+        queue = IngestQueue(db, batch_size=2)
+        for n in range(1, 4):
+            queue.add(_post(n))
+
+        db.fail = True
+        with pytest.raises(sqlite3.OperationalError):
+            await queue.flush()
+        assert len(queue) == 3
+
+        db.fail = False
+        await queue.flush()
+        assert [row[0] for batch in db.batches for row in batch] == ['file1', 'file2', 'file3']
+        assert len(queue) == 0
+
+    asyncio.run(test())
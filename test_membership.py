@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import membership
+from membership import MembershipCache
+
+
+class FakeBot:
+    def __init__(self, status='member', delay=0):
+        self.status = status
+        self.delay = delay
+        self.calls = 0
+
+    async def get_chat_member(self, chat, user_id):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if isinstance(self.status, Exception):
+            raise self.status
+        return SimpleNamespace(status=self.status)
+
+
+def test_positive_and_negative_ttl(monkeypatch):
+    async def test():
+        now = [1000.0]
+        monkeypatch.setattr(membership, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+        cache = MembershipCache(positive_ttl=300, negative_ttl=15)
+        bot = FakeBot('left')
+
+        assert await cache.is_member(bot, '@Channel', 1) is False
+        now[0] += 10
+        assert await cache.is_member(bot, 'channel', 1) is False
+        assert bot.calls == 1
+        # Non-members are only trusted briefly
+        now[0] += 10
+        bot.status = 'member'
+        assert await cache.is_member(bot, '@channel', 1) is True
+        assert bot.calls == 2
+        now[0] += 200
+        assert await cache.is_member(bot, '@channel', 1) is True
+        assert bot.calls == 2
+        now[0] += 200
+        assert cache.get('@channel', 1) is None
+
+    asyncio.run(test())
+
+
+def test_update_overwrites_entry():
+    async def test():
+        cache = MembershipCache()
+        bot = FakeBot('member')
+        assert await cache.is_member(bot, '@channel', 1) is True
+        cache.update('@channel', 1, 'kicked')
+        assert await cache.is_member(bot, '@channel', 1) is False
+        assert bot.calls == 1
+
+    asyncio.run(test())
+
+
+def test_concurrent_lookups_share_one_call():
+    async def test():
+        cache = MembershipCache()
+        bot = FakeBot('member', delay=0.01)
+        results = await asyncio.gather(*(cache.is_member(bot, '@channel', 1) for _ in range(5)))
+        assert results == [True] * 5
+        assert bot.calls == 1
+
+    asyncio.run(test())
+
+
+def test_errors_are_shared_and_not_cached():
+    async def test():
+        cache = MembershipCache()
+        bot = FakeBot(RuntimeError('boom'), delay=0.01)
+        results = await asyncio.gather(*(cache.is_member(bot, '@channel', 1) for _ in range(3)),
+                                       return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert bot.calls == 1
+        bot.status = 'member'
+        assert await cache.is_member(bot, '@channel', 1) is True
+
+    asyncio.run(test())
+
+
+def test_cancelled_lookup_releases_waiters():
+    async def test():
+        cache = MembershipCache()
+        bot = FakeBot('member', delay=10)
+        owner = asyncio.create_task(cache.is_member(bot, '@channel', 1))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.is_member(bot, '@channel', 1))
+        await asyncio.sleep(0)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(waiter, 1)
+        assert not cache._pending
+
+    asyncio.run(test())
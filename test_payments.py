@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import fake_gateway
+from db import Database
+from payments import FAILED, PAID, PENDING, GatewayClient, PaymentWorker, callback_routes, xverify
+
+SALT_KEY = 'test-salt'
+SALT_INDEX = '1'
+
+
+def test_xverify_format():
+    expected = hashlib.sha256(('payload' + SALT_KEY).encode()).hexdigest() + '###1'
+    assert xverify('payload', SALT_KEY, SALT_INDEX) == expected
+
+
+async def _with_bot(tmp_path, test):
+    # A bot-side callback server and a fake gateway that calls it
+    db = Database(str(tmp_path / 'payments.db'))
+    await db.start()
+    settled = []
+
+    async def on_settled(*args):
+        settled.append(args)
+
+    worker = PaymentWorker(db, GatewayClient('http://127.0.0.1:1/{transaction_id}', None), first_check=3600)
+    worker.start(on_settled)
+    bot_app = web.Application()
+    bot_app.router.add_routes(callback_routes(worker, '/callback', SALT_KEY, SALT_INDEX))
+    bot = TestClient(TestServer(bot_app))
+    await bot.start_server()
+    gateways = []
+
+    async def gateway(salt_key=SALT_KEY):
+        client = TestClient(TestServer(fake_gateway.build_app(str(bot.make_url('/callback')), salt_key, SALT_INDEX)))
+        await client.start_server()
+        gateways.append(client)
+        return client
+
+    try:
+        await test(db, worker, gateway, settled)
+    finally:
+        for client in gateways:
+            await client.close()
+        await bot.close()
+        await worker.stop()
+        await db.close()
+
+
+def test_callback_settles_once(tmp_path):
+    async def test(db, worker, gateway, settled):
+        await db.add_user(1)
+        await worker.submit('txn_1', 1, 1, 'paid')
+        client = await gateway()
+
+        response = await client.post('/pay/txn_1', params={'repeat': '3'})
+        assert (await response.json())['callbacks'] == [200, 200, 200]
+        # Repeated callbacks upgrade the plan exactly once
+        assert settled == [('txn_1', PAID, 1, 1, 'paid')]
+        assert await db.payment_status('txn_1') == PAID
+        assert (await db.get_user(1))[0] == 'paid'
+
+    asyncio.run(_with_bot(tmp_path, test))
+
+
+def test_callback_failed_payment(tmp_path):
+    async def test(db, worker, gateway, settled):
+        await db.add_user(2)
+        await worker.submit('txn_2', 2, 2, 'paid')
+        client = await gateway()
+
+        response = await client.post('/pay/txn_2', params={'code': 'PAYMENT_ERROR'})
+        assert (await response.json())['callbacks'] == [200]
+        assert settled == [('txn_2', FAILED, 2, 2, 'paid')]
+        assert (await db.get_user(2))[0] == 'free'
+
+    asyncio.run(_with_bot(tmp_path, test))
+
+
+def test_callback_bad_signature_and_unknown_transaction(tmp_path):
+    async def test(db, worker, gateway, settled):
+        await db.add_user(3)
+        await worker.submit('txn_3', 3, 3, 'paid')
+
+        forged = await gateway(salt_key='wrong-salt')
+        response = await forged.post('/pay/txn_3')
+        assert (await response.json())['callbacks'] == [403]
+
+        client = await gateway()
+        response = await client.post('/pay/txn_unknown')
+        assert (await response.json())['callbacks'] == [404]
+        assert settled == []
+        assert await db.payment_status('txn_3') == PENDING
+
+    asyncio.run(_with_bot(tmp_path, test))
+
+
+def test_status_rejects_non_object_body():
+    async def test():
+        async def status(request):
+            return web.json_response([1])
+
+        app = web.Application()
+        app.router.add_get('/status/{transaction_id}', status)
+        server = TestServer(app)
+        await server.start_server()
+        gateway = GatewayClient(str(server.make_url('/status/')) + '{transaction_id}', None)
+        gateway.start()
+        try:
+            # ValueError is what _check treats as "try again later"
+            with pytest.raises(ValueError):
+                await gateway.status('txn_4')
+        finally:
+            await gateway.aclose()
+            await server.close()
+
+    asyncio.run(test())
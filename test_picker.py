@@ -0,0 +1,86 @@
+import sqlite3
+
+from catalog import Catalog
+from migrations import migrate
+from picker import permute, pick_video, save_cursor
+from seenset import mark_seen
+
+
+def test_permute_is_a_bijection():
+    for size in (1, 2, 3, 7, 64, 100, 1000, 4097):
+        for seed in (0, 1, 12345, 2 ** 62 + 7):
+            positions = [permute(index, size, seed) for index in range(size)]
+            assert sorted(positions) == list(range(size))
+
+
+def test_permute_depends_on_seed():
+    first = [permute(index, 1000, 1) for index in range(1000)]
+    second = [permute(index, 1000, 2) for index in range(1000)]
+    assert first != second
+
+
+def _catalog_db(count, quarantined=()):
+    conn = sqlite3.connect(':memory:')
+    migrate(conn)
+    conn.execute("INSERT INTO users (user_id, plan, daily_count, last_access) VALUES (1, 'free', 0, 0)")
+    conn.executemany("INSERT INTO videos (file_id, file_type) VALUES (?, 'Video')",
+                     [(f'file{i}',) for i in range(count)])
+    for video_id in quarantined:
+        conn.execute("INSERT INTO video_quarantine (video_id, reason, status, quarantined_at, next_probe_at) "
+                     "VALUES (?, 'test', 'suspect', 0, 0)", (video_id,))
+    catalog = Catalog()
+    catalog.load(conn.cursor())
+    return conn, catalog
+
+
+def _deliver_all(conn, catalog):
+    delivered = []
+    while True:
+        picked = pick_video(conn.cursor(), 1, catalog, ['Video'])
+        if picked is None:
+            return delivered
+        video_id, _, _, state = picked
+        mark_seen(conn.cursor(), 1, video_id)
+        save_cursor(conn.cursor(), 1, state)
+        delivered.append(video_id)
+
+
+def test_pick_every_item_once():
+    conn, catalog = _catalog_db(50)
+    delivered = _deliver_all(conn, catalog)
+    assert sorted(delivered) == list(range(1, 51))
+
+
+def test_quarantined_items_keep_positions():
+    conn, catalog = _catalog_db(10, quarantined=[4, 9])
+    assert list(catalog.partition('Video')) == list(range(1, 11))
+    delivered = _deliver_all(conn, catalog)
+    assert sorted(delivered) == [1, 2, 3, 5, 6, 7, 8, 10]
+
+    catalog.restore(9)
+    assert list(catalog.partition('Video')) == list(range(1, 11))
+    assert catalog.get(9) == ('file8', 'Video')
+
+
+def _add_items(conn, catalog, start, count):
+    conn.executemany("INSERT INTO videos (file_id, file_type) VALUES (?, 'Video')",
+                     [(f'file{i}',) for i in range(start, start + count)])
+    catalog.load(conn.cursor(), catalog.max_id)
+
+
+def test_items_added_later_are_picked_once():
+    conn, catalog = _catalog_db(30)
+    delivered = []
+    for _ in range(20):
+        video_id, _, _, state = pick_video(conn.cursor(), 1, catalog, ['Video'])
+        mark_seen(conn.cursor(), 1, video_id)
+        save_cursor(conn.cursor(), 1, state)
+        delivered.append(video_id)
+
+    # Added while the cursor's segment is still in use
+    _add_items(conn, catalog, 30, 15)
+    delivered += _deliver_all(conn, catalog)
+    # Added after the saved cursor was exhausted
+    _add_items(conn, catalog, 45, 5)
+    delivered += _deliver_all(conn, catalog)
+    assert sorted(delivered) == list(range(1, 51))
@@ -0,0 +1,75 @@
+import asyncio
+
+from db import Database
+from prefetch import Prefetcher
+
+
+async def _with_db(tmp_path, count, test):
+    db = Database(str(tmp_path / 'prefetch.db'))
+    await db.start()
+    await db.add_user(1)
+    await db.insert_videos([(f'file{i}', f'unique{i}', 'Video') for i in range(count)])
+    # The refills are driven by hand so the test decides when they happen
+    prefetcher = Prefetcher(db, depth=2)
+    try:
+        await test(db, prefetcher)
+    finally:
+        await db.close()
+
+
+def test_queued_picks_are_never_repeated(tmp_path):
+    async def test(db, prefetcher):
+        delivered = []
+        for _ in range(10):
+            video = await prefetcher.take(1, ['Video'])
+            await prefetcher._refill(1)
+            if video is None:
+                break
+            await db.record_delivery(1, video[0], video[3])
+            delivered.append(video[0])
+        assert sorted(delivered) == list(range(1, 9))
+        assert await prefetcher.take(1, ['Video']) is None
+        assert prefetcher.hits > 0
+
+    asyncio.run(_with_db(tmp_path, 8, test))
+
+
+def test_picks_taken_but_not_delivered_are_not_handed_out_again(tmp_path):
+    async def test(db, prefetcher):
+        first = await prefetcher.take(1, ['Video'])
+        await prefetcher._refill(1)
+        second = await prefetcher.take(1, ['Video'])
+        # Nothing recorded yet, but the chain still moves on
+        assert first[0] != second[0]
+        assert all(pick.video[0] not in (first[0], second[0]) for pick in prefetcher._users[1].picks)
+
+    asyncio.run(_with_db(tmp_path, 8, test))
+
+
+def test_release_restarts_from_the_stored_cursor(tmp_path):
+    async def test(db, prefetcher):
+        # A stored cursor to come back to
+        video = await prefetcher.take(1, ['Video'])
+        await db.record_delivery(1, video[0], video[3])
+        first = await prefetcher.take(1, ['Video'])
+        await prefetcher._refill(1)
+        # The send failed; the retry must get the same item again
+        prefetcher.release(1)
+        assert len(prefetcher) == 0
+        retry = await prefetcher.take(1, ['Video'])
+        assert retry[0] == first[0]
+
+    asyncio.run(_with_db(tmp_path, 8, test))
+
+
+def test_quarantined_picks_are_skipped(tmp_path):
+    async def test(db, prefetcher):
+        await prefetcher.take(1, ['Video'])
+        await prefetcher._refill(1)
+        queued = [pick.video[0] for pick in prefetcher._users[1].picks]
+        await db.quarantine_video(queued[0], 'test')
+        video = await prefetcher.take(1, ['Video'])
+        assert video[0] == queued[1]
+        assert prefetcher.stale == 1
+
+    asyncio.run(_with_db(tmp_path, 8, test))
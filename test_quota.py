@@ -0,0 +1,35 @@
+import sqlite3
+
+from migrations import migrate
+from quota import refund, try_consume, used_today
+
+
+def _conn():
+    conn = sqlite3.connect(':memory:')
+    migrate(conn)
+    return conn
+
+
+def test_try_consume_stops_at_limit():
+    conn = _conn()
+    assert [try_consume(conn, 1, 3, 100) for _ in range(5)] == [1, 2, 3, None, None]
+    assert used_today(conn, 1, 100) == 3
+    # Another day and another user have their own buckets
+    assert try_consume(conn, 1, 3, 101) == 1
+    assert try_consume(conn, 2, 3, 100) == 1
+
+
+def test_refund_gives_a_unit_back():
+    conn = _conn()
+    try_consume(conn, 1, 1, 100)
+    assert try_consume(conn, 1, 1, 100) is None
+    refund(conn, 1, 100)
+    assert try_consume(conn, 1, 1, 100) == 1
+    # Never goes below zero
+    refund(conn, 1, 100)
+    refund(conn, 1, 100)
+    assert used_today(conn, 1, 100) == 0
+
+
+def test_zero_limit():
+    assert try_consume(_conn(), 1, 0, 100) is None
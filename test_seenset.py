@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from seenset import ARRAY_MAX, SeenSet
+
+
+def _round_trip(seen):
+    return SeenSet.from_bytes(seen.to_bytes())
+
+
+def test_empty_round_trip():
+    seen = _round_trip(SeenSet())
+    assert len(seen) == 0
+    assert list(seen) == []
+
+
+def test_array_chunks_round_trip():
+    ids = [1, 2, 65535, 65536, 65537, 3 << 16, (1 << 32) - 1]
+    seen = SeenSet()
+    for video_id in ids:
+        assert seen.add(video_id)
+    assert not seen.add(2)
+
+    loaded = _round_trip(seen)
+    assert len(loaded) == len(ids)
+    assert list(loaded) == sorted(ids)
+    assert all(video_id in loaded for video_id in ids)
+    assert 3 not in loaded
+
+
+def test_bitmap_chunk_round_trip():
+    rng = random.Random(5)
+    # Enough ids in one chunk to switch it to a bitmap, plus a sparse chunk
+    ids = set(rng.sample(range(65536), ARRAY_MAX + 100)) | {70000, 70001}
+    seen = SeenSet()
+    for video_id in ids:
+        seen.add(video_id)
+
+    loaded = _round_trip(seen)
+    assert len(loaded) == len(ids)
+    assert list(loaded) == sorted(ids)
+    assert loaded.to_bytes() == seen.to_bytes()
+
+
+def test_unknown_format_version():
+    data = bytearray(SeenSet().to_bytes())
+    data[0] = 99
+    with pytest.raises(ValueError):
+        SeenSet.from_bytes(bytes(data))
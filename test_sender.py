@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter
+
+from sender import BACKGROUND, LOW, USER, SendScheduler
+
+
+def test_higher_priority_sent_first():
+    async def test():
+        sender = SendScheduler(global_rate=1000)
+        sender.start()
+        sent = []
+
+        async def send_message(chat_id, text):
+            sent.append(text)
+            return text
+
+        # Queued before the dispatcher gets to run, so only priority decides
+        futures = [
+            sender.submit(send_message, LOW, chat_id=1, text='low'),
+            sender.submit(send_message, BACKGROUND, chat_id=2, text='background'),
+            sender.submit(send_message, USER, chat_id=3, text='user'),
+            sender.submit(send_message, USER, chat_id=4, text='user again'),
+        ]
+        assert await asyncio.gather(*futures) == ['low', 'background', 'user', 'user again']
+        assert sent == ['user', 'user again', 'background', 'low']
+        assert sender.sent == 4
+        await sender.stop()
+
+    asyncio.run(test())
+
+
+def test_retry_after_pauses_and_retries():
+    async def test():
+        sender = SendScheduler(global_rate=1000)
+        sender.start()
+        calls = []
+
+        async def send_message(chat_id, text):
+            calls.append(text)
+            if len(calls) == 1:
+                raise RetryAfter(0.05)
+            return 'ok'
+
+        assert await sender.send(send_message, chat_id=1, text='hi') == 'ok'
+        assert calls == ['hi', 'hi']
+        assert sender.retry_afters == 1
+        assert sender.failed == 0
+        await sender.stop()
+
+    asyncio.run(test())
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def test():
+        sender = SendScheduler(global_rate=1000, max_retries=1)
+        sender.start()
+
+        async def send_message(chat_id, text):
+            raise RetryAfter(0.01)
+
+        with pytest.raises(RetryAfter):
+            await sender.send(send_message, chat_id=1, text='hi')
+        assert sender.retry_afters == 2
+        assert sender.failed == 1
+        await sender.stop()
+
+    asyncio.run(test())
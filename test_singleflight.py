@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_same_key_runs_in_order_and_collapses_extra_calls():
+    async def test():
+        flights = SingleFlight(max_queued=1)
+        release = asyncio.Event()
+        order = []
+
+        async def tap(n):
+            order.append(('start', n))
+            await release.wait()
+            order.append(('end', n))
+
+        tasks = [asyncio.create_task(flights.run('user', tap, n)) for n in range(4)]
+        await asyncio.sleep(0)
+        # One running, one queued behind it, the rest collapsed
+        assert flights.busy('user')
+        release.set()
+        assert await asyncio.gather(*tasks) == [True, True, False, False]
+        assert order == [('start', 0), ('end', 0), ('start', 1), ('end', 1)]
+        assert flights.stats() == {'keys': 0, 'ran': 2, 'collapsed': 2}
+
+    asyncio.run(test())
+
+
+def test_different_keys_run_concurrently():
+    async def test():
+        flights = SingleFlight(max_queued=0)
+        running = set()
+        both = asyncio.Event()
+
+        async def tap(key):
+            running.add(key)
+            if len(running) == 2:
+                both.set()
+            await asyncio.wait_for(both.wait(), 1)
+
+        assert await asyncio.gather(flights.run('a', tap, 'a'), flights.run('b', tap, 'b')) == [True, True]
+        assert len(flights) == 0
+
+    asyncio.run(test())
+
+
+def test_key_released_after_error():
+    async def test():
+        flights = SingleFlight()
+
+        async def fail():
+            raise RuntimeError('boom')
+
+        async def ok():
+            pass
+
+        with pytest.raises(RuntimeError):
+            await flights.run('user', fail)
+        assert not flights.busy('user')
+        assert await flights.run('user', ok) is True
+
+    asyncio.run(test())
@@ -0,0 +1,48 @@
+from vulgarity import MILD, NONE, SEVERE, Matcher, normalize, parse_word_list
+
+
+def test_normalize():
+    assert normalize("B4D   w0rd!") == "bad word"
+    # Runs are left for the matcher to handle
+    assert normalize("Poooop") == "poooop"
+    assert normalize("Véry-bad-wörd") == "very bad word"
+    assert normalize("VeRyBaDwOrD") == "verybadword"
+
+
+def test_matcher_severity():
+    matcher = Matcher([("bad word", MILD), ("verybadword", SEVERE), ("he", MILD), ("she", SEVERE)])
+    assert matcher.severity("nothing to see") == NONE
+    assert matcher.severity("what a B4D w0rd") == MILD
+    assert matcher.severity("VeRyBaDwOrD") == SEVERE
+    # Overlapping terms found through failure links
+    assert matcher.severity("ushers") == SEVERE
+    assert matcher.severity("the end") == MILD
+
+
+def test_matcher_repeated_letters():
+    terms = [("ass", MILD), ("poop", SEVERE), ("butt", MILD), ("boob", MILD), ("hell", MILD), ("bad word", MILD)]
+    matcher = Matcher(terms)
+    assert matcher.severity("B4D w0rrrd") == MILD
+    assert matcher.severity("baaad word") == MILD
+    assert matcher.severity("poooooop") == SEVERE
+    assert matcher.severity("buuutt") == MILD
+    # A term's own double letter is required, not collapsed away
+    for text in ("pop music", "I was there", "he has one", "but why", "a bob cut", "helo"):
+        assert matcher.severity(text) == NONE, text
+    # Plain text matches exactly as a substring search would
+    for text in ("pop music", "I was there", "he has one", "but why", "a bob cut", "hello", "hell no", "a boob"):
+        expected = max((severity for term, severity in terms if term in text.lower()), default=NONE)
+        assert matcher.severity(text) == expected, text
+
+
+def test_matcher_agrees_with_substring_search():
+    terms = [("abc", MILD), ("bcd", SEVERE), ("cde", MILD), ("xyz", MILD)]
+    matcher = Matcher(terms)
+    for text in ("abcd", "zabcz", "cdef", "bcdx", "xy z", "abxyz", ""):
+        expected = max((severity for term, severity in terms if term in text), default=NONE)
+        assert matcher.severity(text) == expected, text
+
+
+def test_parse_word_list():
+    lines = ["# comment", "first", "", "[severe]", "worst", "[mild]", "meh"]
+    assert list(parse_word_list(lines)) == [("first", MILD), ("worst", SEVERE), ("meh", MILD)]
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+import re
+import unicodedata
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+NONE = 0
+MILD = 1
+SEVERE = 2
+
+SEVERITIES = {'mild': MILD, 'severe': SEVERE}
+
+# Common look-alike substitutions, applied after lower-casing. Punctuation
+# such as '!' is left alone; it is far more often just punctuation.
+LEET = str.maketrans({
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b', '@': 'a', '$': 's',
+})
+
+_NOT_LETTERS = re.compile(r'[\W\d_]+')
+
+
+def normalize(text):
+    """Fold text so that 'B4D   w0rd' and 'bad word' look the same.
+
+    Accents are stripped, case is folded, leetspeak is undone and anything
+    that is not a letter becomes a space. Runs of the same letter are kept;
+    Matcher treats them as optional, so a term's own double letters still
+    count. Patterns go through the same function, so both sides agree.
+    """
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.casefold().translate(LEET)
+    text = _NOT_LETTERS.sub(' ', text)
+    return text.strip()
+
+
+# Aho-Corasick automaton over normalized text.
+#
+# Built once from the whole word list; scanning a message then costs one pass
+# over its characters no matter how many terms there are, instead of one
+# substring search per term. Each state remembers the highest severity of any
+# term ending there (including via its failure links), so a scan only has to
+# track a running maximum.
+#
+# A letter that repeats the one just matched, where the term has no such
+# letter next, is skipped instead of breaking the match, so 'baaad' and
+# 'poooop' still match 'bad' and 'poop' while 'pop' does not match 'poop'.
+class Matcher:
+    def __init__(self, terms):
+        """terms: iterable of (term, severity)."""
+        self._goto = [{}]
+        self._fail = [0]
+        self._severity = [NONE]
+        self.size = 0
+        for term, severity in terms:
+            self._add(normalize(term), severity)
+        self._link()
+
+    def _add(self, term, severity):
+        if not term:
+            return
+        state = 0
+        for ch in term:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._severity.append(NONE)
+            state = nxt
+        self._severity[state] = max(self._severity[state], severity)
+        self.size += 1
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._severity[nxt] = max(self._severity[nxt], self._severity[self._fail[nxt]])
+
+    def severity(self, text, normalized=False):
+        """Highest severity of any term found in text, or NONE."""
+        if not normalized:
+            text = normalize(text)
+        goto, fail, severities = self._goto, self._fail, self._severity
+        best = NONE
+        state = 0
+        prev = None
+        for ch in text:
+            if ch not in goto[state]:
+                if ch == prev and state:
+                    continue
+                while state and ch not in goto[state]:
+                    state = fail[state]
+            state = goto[state].get(ch, 0)
+            prev = ch
+            if severities[state] > best:
+                best = severities[state]
+                if best == SEVERE:
+                    break
+        return best
+
+
+def parse_word_list(lines):
+    """Yield (term, severity) from a word list file.
+
+    Terms are one per line under [mild] or [severe] section headers; blank
+    lines and lines starting with # are ignored. Terms before any header are
+    mild.
+    """
+    severity = MILD
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            name = line[1:-1].strip().lower()
+            if name not in SEVERITIES:
+                raise ValueError(f"Unknown severity section: {line}")
+            severity = SEVERITIES[name]
+            continue
+        yield line, severity
+
+
+def load_matcher(path):
+    with open(path, encoding='utf-8') as f:
+        return Matcher(list(parse_word_list(f)))
+
+
+class WordFilter:
+    """A Matcher that follows a word list file and rebuilds when it changes.
+
+    Rebuilding happens on a worker thread and the new automaton is swapped in
+    with a single assignment, so messages keep being checked against the old
+    one in the meantime. Without a file (or until it exists) the built-in
+    `defaults` are used.
+    """
+
+    def __init__(self, path=None, defaults=()):
+        self.path = path
+        self.matcher = Matcher(defaults)
+        self._mtime = None
+        self._task = None
+        if path and os.path.exists(path):
+            self.matcher = load_matcher(path)
+            self._mtime = os.stat(path).st_mtime
+            logger.info(f"Loaded {self.matcher.size} filter terms from {path}.")
+
+    def severity(self, text, normalized=False):
+        return self.matcher.severity(text, normalized)
+
+    async def reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            matcher = await asyncio.to_thread(load_matcher, self.path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Keeping the old filter; failed to load {self.path}: {e}")
+            return False
+        self.matcher, self._mtime = matcher, mtime
+        logger.info(f"Reloaded {matcher.size} filter terms from {self.path}.")
+        return True
+
+    def start(self, interval=5.0):
+        if self.path:
+            self._task = asyncio.create_task(self._watch(interval))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _watch(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            await self.reload_if_changed()
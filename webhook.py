@@ -0,0 +1,104 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+# Embedded webhook server, used instead of run_polling when BOT_MODE=webhook.
+#
+# Telegram POSTs each update to `path` with the secret token in a header. The
+# handler checks the token, decodes the body and puts the Update on PTB's own
+# update queue, then answers 200 straight away; handlers run afterwards exactly
+# as they do under polling. The PTB Application must be built with
+# .updater(None) since nothing polls.
+def build_app(application, path, secret_token, routes=()):
+    app = web.Application()
+    secret = secret_token.encode()
+
+    async def receive_update(request):
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), secret):
+            logger.warning(f"Rejected webhook call from {request.remote}: bad secret token")
+            return web.Response(status=403)
+
+        try:
+            data = json.loads(await request.read())
+            if not isinstance(data, dict):
+                raise ValueError(f"expected an object, got {type(data).__name__}")
+            update = Update.de_json(data, application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            return web.Response(status=400)
+
+        await application.update_queue.put(update)
+        return web.Response()
+
+    app.router.add_post(path, receive_update)
+    app.router.add_routes(routes)
+    return app
+
+
+async def start_server(routes, listen, port):
+    """Serve extra routes on their own, e.g. payment callbacks while polling; returns the runner."""
+    app = web.Application()
+    app.router.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, listen, port).start()
+    logger.info(f"Listening for HTTP callbacks on {listen}:{port}")
+    return runner
+
+
+async def run_webhook(application, listen, port, path, secret_token, url=None,
+                      max_connections=40, allowed_updates=None, routes=()):
+    """Serve updates over HTTP until SIGINT/SIGTERM.
+
+    When `url` is set the webhook is registered with Telegram as url + path;
+    without it the server just listens, which is handy for replaying recorded
+    updates locally.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = web.AppRunner(build_app(application, path, secret_token, routes))
+    await application.initialize()
+    try:
+        # run_polling calls these hooks itself; here we have to
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+
+        if url:
+            await application.bot.set_webhook(
+                url=url.rstrip('/') + path,
+                secret_token=secret_token,
+                max_connections=max_connections,
+                allowed_updates=allowed_updates
+            )
+            logger.info(f"Webhook registered at {url.rstrip('/')}{path} (max_connections={max_connections})")
+        else:
+            logger.info("WEBHOOK_URL is not set; serving without registering the webhook")
+
+        await runner.setup()
+        await web.TCPSite(runner, listen, port).start()
+        logger.info(f"Listening for updates on {listen}:{port}{path}")
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)